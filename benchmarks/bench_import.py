@@ -0,0 +1,76 @@
+"""
+Measures the time taken to import the package in a fresh interpreter, to
+guard short-lived CLI runs and worker processes against slow imports.
+
+Usage:
+    python benchmarks/bench_import.py [--runs N] [--max-ms MS]
+        [--output results.json]
+
+Each statement is timed inside new processes, excluding interpreter
+startup, and the median over the runs is reported along with the
+third-party modules it loads.  With --max-ms, exits non-zero if
+'import cordra' takes longer.
+"""
+import argparse
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    'import cordra',
+    'from cordra import CordraClient',
+    'from cordra import AsyncCordraClient',
+]
+
+TIMER = ('import time; start = time.perf_counter(); {statement}; '
+         'print(time.perf_counter() - start)')
+
+
+def measure(statement, runs):
+    """Returns the median seconds to run statement in a new interpreter."""
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', TIMER.format(statement=statement)],
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout))
+    return statistics.median(times)
+
+
+def imported_modules(statement):
+    """Returns the third-party top-level modules loaded by statement."""
+    code = (f'import sys; before = set(sys.modules); {statement}; '
+            'print("\\n".join(sorted({m.split(".")[0] for m in set(sys.modules) - before})))')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         check=True)
+    stdlib = getattr(sys, 'stdlib_module_names', set())
+    return [m for m in out.stdout.split() if m not in stdlib and not m.startswith('_')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--max-ms', type=float,
+                        help="fail if 'import cordra' takes longer than this")
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    results = []
+    for statement in STATEMENTS:
+        seconds = measure(statement, args.runs)
+        modules = imported_modules(statement)
+        results.append({'statement': statement, 'seconds': seconds, 'modules': modules})
+        print(f'{statement:<40} {seconds * 1000:>8.2f} ms  loads: {", ".join(modules)}')
+
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps({'python': sys.version, 'results': results},
+                                                indent=2))
+
+    if args.max_ms is not None and results[0]['seconds'] * 1000 > args.max_ms:
+        print(f"'import cordra' took over {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares pooled (keep-alive) and unpooled RestClient calls against a local
+stand-in server.
+
+Usage:
+    python benchmarks/bench_pooling.py [--calls N] [--threads N]
+        [--certfile cert.pem --keyfile key.pem]
+
+Passing a certificate and key serves over TLS, which is where connection
+reuse matters most as every unpooled call pays a full TLS handshake.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cordra import CordraClient
+
+from mockcordra import MockCordra
+
+
+def run(host, calls, threads, keep_alive):
+    with CordraClient(host, username='', verify=False, pool_maxsize=threads,
+                      keep_alive=keep_alive) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda i: client.retrieve('test/abc'), range(calls)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    args = parser.parse_args()
+
+    with MockCordra(certfile=args.certfile, keyfile=args.keyfile) as server:
+        server.store.put('test/abc', 'Document', {'name': 'x'})
+        for name, keep_alive in [('unpooled', False), ('pooled', True)]:
+            elapsed = run(server.host, args.calls, args.threads, keep_alive)
+            print(f'{name:>9}: {args.calls} calls in {elapsed:.3f} s '
+                  f'({args.calls / elapsed:.0f} calls/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,710 @@
+"""
+Local stand-in for a Cordra server, for running benchmarks offline.
+
+Implements, in memory, the parts of the Cordra REST API the client uses:
+objects create/retrieve/update/delete/search (with jsonPointer, filter,
+full, paging and payloads with Range support), acls, batchUpload,
+auth/token, auth/introspect, auth/revoke and check-credentials.
+Responses can be delayed and a fraction of calls can be failed with 503
+to exercise retries and limiters.  Request bodies sent with a gzip,
+deflate or zstd Content-Encoding are decoded, and JSON responses can be
+gzipped.
+
+Usage as a script:
+    python benchmarks/mockcordra.py [--port 8080] [--latency 0.01]
+        [--error-rate 0.01] [--gzip-min-size 1024]
+"""
+import argparse
+import base64
+import gzip
+from email.parser import BytesParser
+from email import policy
+import json
+import random
+import re
+import ssl
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import uuid
+
+PREFIX = 'test'
+
+
+def resolve(obj, pointer):
+    """Returns the value at a jsonPointer, raising KeyError if missing."""
+    if pointer in ('', '/'):
+        return obj
+    for part in pointer.lstrip('/').split('/'):
+        part = part.replace('~1', '/').replace('~0', '~')
+        if isinstance(obj, list):
+            obj = obj[int(part)]
+        else:
+            obj = obj[part]
+    return obj
+
+
+def assign(obj, pointer, value):
+    """Sets the value at a jsonPointer, returning the new root."""
+    if pointer in ('', '/'):
+        return value
+    parts = [p.replace('~1', '/').replace('~0', '~') for p in pointer.lstrip('/').split('/')]
+    parent = resolve(obj, '/' + '/'.join(parts[:-1])) if len(parts) > 1 else obj
+    if isinstance(parent, list):
+        parent[int(parts[-1])] = value
+    else:
+        parent[parts[-1]] = value
+    return obj
+
+
+def apply_filter(obj, pointers):
+    """Restricts an object to the given jsonPointers."""
+    out = {}
+    for pointer in pointers:
+        try:
+            value = resolve(obj, pointer)
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+        parts = [p.replace('~1', '/').replace('~0', '~') for p in pointer.lstrip('/').split('/')]
+        target = out
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return out
+
+
+class Query():
+    """
+    Minimal parser for the Lucene queries the client sends: field:value,
+    quoted values, field:[a TO b] ranges with inclusive [] or exclusive {}
+    bounds, *:*, parentheses, AND, OR and NOT.
+    """
+    TOKEN = re.compile(r'\s*(\(|\)|[\[{](?:"(?:\\.|[^"\\])*"|[^\]}"])*[\]}]'
+                       r'|"(?:\\.|[^"\\])*"|(?:\\.|[^\s()":])+|:)')
+
+    def __init__(self, text):
+        self.tokens = [t for t in self.TOKEN.findall(text) if t]
+        self.pos = 0
+        self.tree = self.parse_or() if self.tokens else ('all',)
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == 'OR':
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return ('not', self.parse_term())
+        return self.parse_term()
+
+    def parse_term(self):
+        token = self.take()
+        if token == '(':
+            node = self.parse_or()
+            self.take()
+            return node
+        if self.peek() == ':':
+            self.take()
+            value = self.take()
+            field = unescape(token)
+            if field == '*' and value == '*':
+                return ('all',)
+            if value[0] in '[{':
+                low, high = value[1:-1].split(' TO ')
+                return ('range', field, unescape(low.strip()), unescape(high.strip()),
+                        value[0] == '[', value[-1] == ']')
+            return ('eq', field, unescape(value))
+        return ('text', unescape(token))
+
+    def match(self, obj, node=None):
+        node = self.tree if node is None else node
+        kind = node[0]
+        if kind == 'all':
+            return True
+        if kind == 'or':
+            return self.match(obj, node[1]) or self.match(obj, node[2])
+        if kind == 'and':
+            return self.match(obj, node[1]) and self.match(obj, node[2])
+        if kind == 'not':
+            return not self.match(obj, node[1])
+        if kind == 'text':
+            return node[1].lower() in json.dumps(obj['content']).lower()
+        value = field_value(obj, node[1])
+        if kind == 'eq':
+            return value is not None and str(value) == node[2]
+        low, high, low_inclusive, high_inclusive = node[2:]
+        if value is None:
+            return False
+        convert = float if isinstance(value, (int, float)) else str
+        if low != '*' and (convert(value) < convert(low) or
+                           not low_inclusive and convert(value) == convert(low)):
+            return False
+        if high != '*' and (convert(value) > convert(high) or
+                            not high_inclusive and convert(value) == convert(high)):
+            return False
+        return True
+
+
+def unescape(token):
+    if token.startswith('"') and token.endswith('"'):
+        token = token[1:-1]
+    return re.sub(r'\\(.)', r'\1', token)
+
+
+def field_value(obj, field):
+    if field in ('id', 'type'):
+        return obj[field]
+    try:
+        if field.startswith('/'):
+            return resolve(obj['content'], field)
+        return resolve(obj, field)
+    except (KeyError, IndexError, ValueError, TypeError):
+        return None
+
+
+class Store():
+    """Thread-safe in-memory object, payload and token store."""
+    def __init__(self, users=None):
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.payloads = {}
+        self.tokens = {}
+        self.users = users
+
+    def now(self):
+        return int(time.time() * 1000)
+
+    def put(self, id, obj_type, content, acl=None, payloads=None, user='admin',
+            payloads_to_delete=()):
+        with self.lock:
+            now = self.now()
+            existing = self.objects.get(id)
+            if existing is None:
+                existing = {'id': id, 'type': obj_type, 'content': None,
+                            'metadata': {'createdOn': now, 'createdBy': user}}
+            else:
+                existing = json.loads(json.dumps(existing))
+            existing['type'] = obj_type or existing['type']
+            existing['content'] = content
+            if acl is not None:
+                existing['acl'] = acl
+            existing['metadata']['modifiedOn'] = max(now, existing['metadata'].get('modifiedOn', 0) + 1)
+            existing['metadata']['modifiedBy'] = user
+            existing['metadata']['txnId'] = existing['metadata']['modifiedOn']
+            payload_list = {p['name']: p for p in existing.get('payloads', [])}
+            for name in payloads_to_delete:
+                payload_list.pop(name, None)
+                self.payloads.pop((id, name), None)
+            for name, (filename, media_type, data) in (payloads or {}).items():
+                payload_list[name] = {'name': name, 'filename': filename,
+                                      'mediaType': media_type, 'size': len(data)}
+                self.payloads[(id, name)] = data
+            if payload_list:
+                existing['payloads'] = list(payload_list.values())
+            self.objects[id] = existing
+            return existing
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server_version = 'MockCordra'
+
+    def log_message(self, *args):
+        pass
+
+    # Helpers
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def send_body(self, code, body=b'', content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        headers = dict(headers or {})
+        min_size = self.server.gzip_min_size
+        if (min_size is not None and len(body) >= min_size and content_type == 'application/json'
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            body = gzip.compress(body, 6)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(code)
+        if body or code not in (204, 304):
+            self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_error_json(self, code, message):
+        self.send_body(code, {'message': message})
+
+    def read_body(self):
+        body = self.read_raw_body()
+        self.server.count_bytes(len(body))
+        encoding = self.headers.get('Content-Encoding', 'identity').lower()
+        if encoding in ('gzip', 'deflate'):
+            return zlib.decompress(body, 47)
+        if encoding == 'zstd':
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(body, max_output_size=2**31)
+        if encoding != 'identity':
+            raise ValueError(f'unsupported Content-Encoding {encoding}')
+        return body
+
+    def read_raw_body(self):
+        length = self.headers.get('Content-Length')
+        if length is not None:
+            return self.rfile.read(int(length))
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return b''
+
+    def form(self, body):
+        """Parses a multipart or urlencoded body into fields and files."""
+        ctype = self.headers.get('Content-Type', '')
+        fields, files = {}, {}
+        if ctype.startswith('multipart/form-data'):
+            message = BytesParser(policy=policy.HTTP).parsebytes(
+                b'Content-Type: ' + ctype.encode() + b'\r\n\r\n' + body)
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                data = part.get_payload(decode=True) or b''
+                filename = part.get_filename()
+                if filename is None:
+                    fields[name] = data.decode('utf-8')
+                else:
+                    files[name] = (filename, part.get_content_type(), data)
+        elif ctype.startswith('application/x-www-form-urlencoded'):
+            fields = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        else:
+            fields = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        return fields, files
+
+    def authenticate(self):
+        """Returns the user name, or None after sending a 401."""
+        header = self.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            with self.store.lock:
+                token = self.store.tokens.get(header[7:])
+            if token is None:
+                self.send_error_json(401, 'Invalid token')
+                return None
+            return token['username']
+        if header.startswith('Basic '):
+            username, _, password = base64.b64decode(header[6:]).decode().partition(':')
+            users = self.store.users
+            if users is not None and users.get(username) != password:
+                self.send_error_json(401, 'Authentication failed')
+                return None
+            return username
+        return 'anonymous'
+
+    def inject(self):
+        """Applies the configured latency and errors.  True if failed."""
+        server = self.server
+        delay = server.latency
+        if server.jitter:
+            delay += server.random.uniform(0, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if server.error_rate and server.random.random() < server.error_rate:
+            self.read_body()
+            self.send_body(503, {'message': 'Injected error'},
+                           headers={'Retry-After': '0'})
+            return True
+        return False
+
+    def flag(self, params, name):
+        return params.get(name, ['false'])[0].lower() == 'true'
+
+    def response_object(self, obj, params):
+        if self.flag(params, 'full'):
+            out = obj
+        else:
+            out = obj['content']
+        if 'filter' in params:
+            out = apply_filter(out, json.loads(params['filter'][0]))
+        return out
+
+    # Routing
+
+    def route(self):
+        if self.inject():
+            return
+        url = urlsplit(self.path)
+        path = unquote(url.path).strip('/')
+        params = parse_qs(url.query)
+        self.server.count(self.command, path)
+
+        if path.startswith('auth/'):
+            return self.auth(path, params)
+
+        user = self.authenticate()
+        if user is None:
+            return
+
+        if path == 'check-credentials':
+            return self.send_body(200, {'active': user != 'anonymous', 'username': user})
+        if path == 'batchUpload' and self.command == 'POST':
+            return self.batch_upload(params, user)
+        if path == 'objects':
+            if self.command == 'GET':
+                return self.search(params)
+            if self.command == 'POST':
+                return self.create(params, user)
+        if path.startswith('objects/'):
+            id = path[len('objects/'):]
+            if self.command in ('GET', 'HEAD'):
+                return self.retrieve(id, params)
+            if self.command == 'PUT':
+                return self.update(id, params, user)
+            if self.command == 'DELETE':
+                return self.delete(id, params)
+        if path.startswith('acls/'):
+            return self.acls(path[len('acls/'):])
+        self.read_body()
+        self.send_error_json(404, 'Not found')
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = route
+
+    # Endpoints
+
+    def auth(self, path, params):
+        fields, _ = self.form(self.read_body())
+        if not fields and self.headers.get('Content-Type', '').startswith('application/json'):
+            fields = json.loads(self.read_body() or b'{}')
+        store = self.store
+        if path == 'auth/token':
+            username = fields.get('username')
+            if store.users is not None and store.users.get(username) != fields.get('password'):
+                return self.send_error_json(401, 'Authentication failed')
+            token = uuid.uuid4().hex
+            with store.lock:
+                store.tokens[token] = {'username': username, 'iat': int(time.time())}
+            return self.send_body(200, {'access_token': token, 'token_type': 'Bearer',
+                                        'active': True, 'username': username})
+        if path == 'auth/introspect':
+            with store.lock:
+                info = store.tokens.get(fields.get('token'))
+            if info is None:
+                return self.send_body(200, {'active': False})
+            return self.send_body(200, {'active': True, **info})
+        if path == 'auth/revoke':
+            with store.lock:
+                store.tokens.pop(fields.get('token'), None)
+            return self.send_body(200, {'active': False})
+        self.send_error_json(404, 'Not found')
+
+    def new_id(self, params):
+        if 'handle' in params:
+            return params['handle'][0]
+        if 'suffix' in params:
+            return f'{PREFIX}/{params["suffix"][0]}'
+        return f'{PREFIX}/{uuid.uuid4().hex[:20]}'
+
+    def create(self, params, user):
+        body = self.read_body()
+        if self.headers.get('Content-Type', '').startswith('multipart/form-data'):
+            fields, files = self.form(body)
+            content = json.loads(fields['content'])
+            acl = json.loads(fields['acl']) if 'acl' in fields else None
+        else:
+            content, acl, files = json.loads(body), None, {}
+        id = self.new_id(params)
+        with self.store.lock:
+            if id in self.store.objects:
+                return self.send_error_json(409, 'Object already exists')
+            if self.flag(params, 'dryRun'):
+                obj = {'id': id, 'type': params['type'][0], 'content': content}
+            else:
+                obj = self.store.put(id, params['type'][0], content, acl, files, user)
+        self.send_body(200, self.response_object(obj, params))
+
+    def retrieve(self, id, params):
+        with self.store.lock:
+            obj = self.store.objects.get(id)
+            if obj is not None and 'payload' in params:
+                data = self.store.payloads.get((id, params['payload'][0]))
+        if obj is None:
+            return self.send_error_json(404, 'Missing object')
+
+        if 'payload' in params:
+            if data is None:
+                return self.send_error_json(404, 'Missing payload')
+            return self.send_payload(obj, params['payload'][0], data)
+
+        etag = f'"{obj["metadata"]["modifiedOn"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.send_body(304, headers={'ETag': etag})
+
+        out = self.response_object(obj, params)
+        if 'jsonPointer' in params:
+            try:
+                out = resolve(obj['content'], params['jsonPointer'][0])
+            except (KeyError, IndexError, ValueError, TypeError):
+                return self.send_error_json(400, 'Invalid jsonPointer')
+        self.send_body(200, out, headers={'ETag': etag})
+
+    def send_payload(self, obj, name, data):
+        info = next(p for p in obj['payloads'] if p['name'] == name)
+        headers = {'Accept-Ranges': 'bytes'}
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match is None:
+            return self.send_body(200, data, info['mediaType'], headers)
+        start = int(match.group(1)) if match.group(1) else max(0, len(data) - int(match.group(2)))
+        end = int(match.group(2)) if match.group(1) and match.group(2) else len(data) - 1
+        if start >= len(data):
+            return self.send_body(416, b'', headers={'Content-Range': f'bytes */{len(data)}'})
+        end = min(end, len(data) - 1)
+        headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+        self.send_body(206, data[start:end + 1], info['mediaType'], headers)
+
+    def update(self, id, params, user):
+        body = self.read_body()
+        files = {}
+        acl = None
+        if self.headers.get('Content-Type', '').startswith('multipart/form-data'):
+            fields, files = self.form(body)
+            value = json.loads(fields['content'])
+            acl = json.loads(fields['acl']) if 'acl' in fields else None
+        else:
+            value = json.loads(body)
+        with self.store.lock:
+            obj = self.store.objects.get(id)
+            if obj is None:
+                return self.send_error_json(404, 'Missing object')
+            content = json.loads(json.dumps(obj['content']))
+            if 'jsonPointer' in params:
+                try:
+                    content = assign(content, params['jsonPointer'][0], value)
+                except (KeyError, IndexError, ValueError, TypeError):
+                    return self.send_error_json(400, 'Invalid jsonPointer')
+            else:
+                content = value
+            obj_type = params.get('type', [obj['type']])[0]
+            if self.flag(params, 'dryRun'):
+                obj = dict(obj, content=content, type=obj_type)
+            else:
+                obj = self.store.put(id, obj_type, content, acl, files, user,
+                                     payloads_to_delete=params.get('payloadToDelete', []))
+        self.send_body(200, self.response_object(obj, params))
+
+    def delete(self, id, params):
+        with self.store.lock:
+            obj = self.store.objects.get(id)
+            if obj is None:
+                return self.send_error_json(404, 'Missing object')
+            if 'jsonPointer' in params:
+                content = json.loads(json.dumps(obj['content']))
+                pointer = params['jsonPointer'][0]
+                parent = resolve(content, pointer.rsplit('/', 1)[0] or '/')
+                key = pointer.rsplit('/', 1)[1].replace('~1', '/').replace('~0', '~')
+                del parent[int(key) if isinstance(parent, list) else key]
+                self.store.put(id, obj['type'], content)
+            else:
+                del self.store.objects[id]
+                for key in [k for k in self.store.payloads if k[0] == id]:
+                    del self.store.payloads[key]
+        self.send_body(200, {})
+
+    def acls(self, id):
+        body = self.read_body()
+        with self.store.lock:
+            obj = self.store.objects.get(id)
+            if obj is None:
+                return self.send_error_json(404, 'Missing object')
+            if self.command == 'PUT':
+                obj['acl'] = json.loads(body)
+            acl = obj.get('acl', {'readers': None, 'writers': None})
+        self.send_body(200, acl)
+
+    def search(self, params):
+        query = Query(params.get('query', ['*:*'])[0])
+        page_num = int(params.get('pageNum', ['0'])[0])
+        page_size = int(params.get('pageSize', ['-1'])[0])
+        with self.store.lock:
+            hits = [obj for obj in self.store.objects.values() if query.match(obj)]
+
+        if 'sortFields' in params:
+            for spec in reversed(params['sortFields'][0].split(',')):
+                field, _, direction = spec.strip().partition(' ')
+                hits.sort(key=lambda obj: (field_value(obj, field) is None,
+                                           field_value(obj, field)),
+                          reverse=direction.strip().upper() == 'DESC')
+
+        size = len(hits)
+        if page_size > 0:
+            hits = hits[page_num * page_size:(page_num + 1) * page_size]
+        elif page_size == 0:
+            hits = []
+
+        if self.flag(params, 'ids'):
+            results = [obj['id'] for obj in hits]
+        else:
+            results = [self.response_object(obj, params) for obj in hits]
+        self.send_body(200, {'pageNum': page_num, 'pageSize': page_size,
+                             'size': size, 'results': results})
+
+    def batch_upload(self, params, user):
+        body = self.read_body()
+        objs = json.loads(body)
+        fail_fast = self.flag(params, 'failFast')
+        results = []
+        success = True
+        for position, obj in enumerate(objs):
+            try:
+                id = obj.get('id') or self.new_id({})
+                full = self.store.put(id, obj['type'], obj['content'], obj.get('acl'), user=user)
+                results.append({'position': position, 'responseCode': 200, 'response': full})
+            except Exception as e:
+                success = False
+                results.append({'position': position, 'responseCode': 400,
+                                'response': {'message': str(e)}})
+                if fail_fast:
+                    break
+        self.send_body(200, {'results': results, 'success': success})
+
+
+class MockCordra(ThreadingHTTPServer):
+    """
+    Threaded local Cordra stand-in.  Use as a context manager:
+
+        with MockCordra(latency=0.005) as server:
+            client = CordraClient(server.host, username='admin', password='x')
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 users=None, certfile=None, keyfile=None, seed=None, gzip_min_size=None):
+        """
+        Parameters
+        ----------
+        port : int, optional
+            The port to listen on.  0 (default) picks a free one.
+        latency : float, optional
+            Seconds added to every call.
+        jitter : float, optional
+            Maximum random seconds added on top of latency.
+        error_rate : float, optional
+            Fraction of calls answered with 503 and Retry-After: 0.
+        users : dict, optional
+            username: password pairs to check.  By default any credentials
+            are accepted.
+        certfile, keyfile : str, optional
+            Serve over TLS with this certificate and key.
+        seed : int, optional
+            Seed for the latency and error randomness.
+        gzip_min_size : int, optional
+            Gzip JSON responses of at least this many bytes to clients
+            accepting gzip.  By default responses are not compressed.
+        """
+        super().__init__(('127.0.0.1', port), Handler)
+        self.store = Store(users)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.gzip_min_size = gzip_min_size
+        self.calls = {}
+        self.bytes_received = 0
+        self.__calls_lock = threading.Lock()
+        self.scheme = 'http'
+        if certfile is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = 'https'
+        self.__thread = None
+
+    @property
+    def host(self):
+        """str: The URL of the server."""
+        return f'{self.scheme}://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, method, path):
+        endpoint = '/'.join(path.split('/')[:2]) if path.startswith('auth/') else path.split('/')[0]
+        with self.__calls_lock:
+            key = f'{method} {endpoint}'
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def count_bytes(self, n):
+        with self.__calls_lock:
+            self.bytes_received += n
+
+    def start(self):
+        """Serves in a background thread."""
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--gzip-min-size', type=int,
+                        help='gzip JSON responses of at least this many bytes')
+    args = parser.parse_args()
+
+    server = MockCordra(port=args.port, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, certfile=args.certfile,
+                        keyfile=args.keyfile, gzip_min_size=args.gzip_min_size)
+    print(f'Mock Cordra serving at {server.host}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
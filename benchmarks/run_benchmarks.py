@@ -0,0 +1,249 @@
+"""
+Measures CordraClient throughput and latency against a local mock Cordra
+server, without network access.
+
+Covers create, retrieve and delete across object sizes, find across result
+set sizes, payload upload and download across payload sizes, each at
+several concurrency levels.  Results are written as JSON and can be
+compared against an earlier run to catch regressions.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--only NAME]
+        [--latency 0.002] [--error-rate 0.01] [--output results.json]
+        [--compare baseline.json --tolerance 0.2]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cordra import CordraClient, Payloads, __version__
+
+from mockcordra import MockCordra
+
+OBJECT_SIZES = [2**10, 2**16, 2**20]
+PAYLOAD_SIZES = [2**16, 2**20, 2**24]
+RESULT_SIZES = [10, 100, 1000]
+CONCURRENCY = [1, 8]
+
+
+def make_content(size, i=0):
+    """Returns object content whose JSON encoding is about size bytes."""
+    fields = max(1, size // 64)
+    return {'index': i, 'fields': {f'field{j:05d}': 'x' * 48 for j in range(fields)}}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def measure(func, items, concurrency):
+    """Calls func on every item and returns timing statistics."""
+    latencies = []
+    errors = 0
+
+    def call(item):
+        start = time.perf_counter()
+        try:
+            func(item)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for latency, error in executor.map(call, items):
+            latencies.append(latency)
+            if error is not None:
+                errors += 1
+    seconds = time.perf_counter() - start
+
+    return {
+        'ops': len(latencies),
+        'errors': errors,
+        'seconds': seconds,
+        'ops_per_sec': len(latencies) / seconds if seconds else None,
+        'latency': {
+            'mean': statistics.fmean(latencies) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else None,
+        },
+    }
+
+
+class Suite():
+    """The benchmark scenarios, run against one mock server."""
+    def __init__(self, server, calls, retry):
+        self.server = server
+        self.calls = calls
+        self.retry = retry
+        self.results = []
+
+    def client(self, concurrency):
+        return CordraClient(self.server.host, username='admin', password='admin',
+                            pool_maxsize=concurrency, retry=self.retry)
+
+    def record(self, name, params, stats, nbytes=None):
+        stats = dict(name=name, params=params, **stats)
+        if nbytes is not None:
+            stats['bytes_per_sec'] = nbytes * stats['ops'] / stats['seconds']
+        self.results.append(stats)
+        key = ' '.join(f'{k}={v}' for k, v in params.items())
+        print(f'{name:<17} {key:<32} {stats["ops_per_sec"]:>9.1f} ops/s  '
+              f'p50 {stats["latency"]["p50"] * 1000:>8.2f} ms  '
+              f'p99 {stats["latency"]["p99"] * 1000:>8.2f} ms  '
+              f'errors {stats["errors"]}', flush=True)
+
+    def objects(self):
+        for size in OBJECT_SIZES:
+            calls = max(10, self.calls * 2**10 // size) if size > 2**16 else self.calls
+            content = make_content(size)
+            for concurrency in CONCURRENCY:
+                with self.client(concurrency) as client:
+                    ids = [f'test/bench-{size}-{concurrency}-{i}' for i in range(calls)]
+                    params = {'size': size, 'concurrency': concurrency}
+
+                    stats = measure(lambda id: client.create(content, 'Document', handle=id),
+                                    ids, concurrency)
+                    self.record('create', params, stats, size)
+
+                    stats = measure(client.retrieve, ids, concurrency)
+                    self.record('retrieve', params, stats, size)
+
+                    stats = measure(client.delete, ids, concurrency)
+                    self.record('delete', params, stats)
+
+    def find(self):
+        total = max(RESULT_SIZES)
+        with self.client(8) as client:
+            for result in client.batch_upload(
+                    ({'group': 'find', 'index': i} for i in range(total)),
+                    obj_type='Document'):
+                pass
+        for size in RESULT_SIZES:
+            calls = max(5, self.calls * 10 // size)
+            for concurrency in CONCURRENCY:
+                with self.client(concurrency) as client:
+                    stats = measure(lambda i: client.find('/group:find', pageSize=size),
+                                    range(calls), concurrency)
+                    self.record('find', {'results': size, 'concurrency': concurrency}, stats)
+
+    def payloads(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for size in PAYLOAD_SIZES:
+                calls = max(4, self.calls * 2**12 // size)
+                filename = Path(tmpdir, f'payload-{size}.bin')
+                filename.write_bytes(os.urandom(size))
+                for concurrency in CONCURRENCY:
+                    with self.client(concurrency) as client:
+                        ids = [f'test/payload-{size}-{concurrency}-{i}' for i in range(calls)]
+                        params = {'size': size, 'concurrency': concurrency}
+
+                        def upload(id):
+                            with Payloads('data', str(filename)) as payloads:
+                                client.create({'name': id}, 'Document', payloads=payloads,
+                                              handle=id)
+                        stats = measure(upload, ids, concurrency)
+                        self.record('payload_upload', params, stats, size)
+
+                        stats = measure(
+                            lambda id: client.download_payload(id, 'data', io.BytesIO()),
+                            ids, concurrency)
+                        self.record('payload_download', params, stats, size)
+
+                        measure(client.delete, ids, concurrency)
+
+    def run(self, only=None):
+        for name in ['objects', 'find', 'payloads']:
+            if only is None or name in only:
+                getattr(self, name)()
+        return self.results
+
+
+def result_key(result):
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Prints and returns the results slower than the baseline."""
+    previous = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None or not old['ops_per_sec']:
+            continue
+        ratio = result['ops_per_sec'] / old['ops_per_sec']
+        if ratio < 1 - tolerance:
+            regressions.append(result)
+            print(f'REGRESSION {result["name"]} {result["params"]}: '
+                  f'{old["ops_per_sec"]:.1f} -> {result["ops_per_sec"]:.1f} ops/s '
+                  f'({ratio:.2f}x)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=500,
+                        help='calls per small-object scenario, scaled down for large sizes')
+    parser.add_argument('--quick', action='store_true', help='run a tenth of the calls')
+    parser.add_argument('--only', nargs='+', choices=['objects', 'find', 'payloads'])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the mock server adds to every call')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls the mock server fails with 503')
+    parser.add_argument('--retry', type=int, default=None,
+                        help='client retries, defaulting to 3 when errors are injected')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fractional throughput drop before failing')
+    args = parser.parse_args()
+
+    calls = max(10, args.calls // 10) if args.quick else args.calls
+    retry = args.retry
+    if retry is None and args.error_rate:
+        retry = 3
+
+    with MockCordra(latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate, seed=0) as server:
+        results = Suite(server, calls, retry).run(args.only)
+        server_calls = dict(sorted(server.calls.items()))
+
+    output = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'cordra': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'server_calls': server_calls,
+        },
+        'results': results,
+    }
+    Path(args.output).write_text(json.dumps(output, indent=2))
+    print(f'Results written to {args.output}')
+
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
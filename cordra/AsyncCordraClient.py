@@ -0,0 +1,617 @@
+# coding: utf-8
+
+# Standard library imports
+import asyncio
+import getpass
+from pathlib import Path
+import ssl
+
+# https://docs.aiohttp.org
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .aslist import aslist
+from .ConcurrencyLimiter import ConcurrencyLimiter
+from .JSONCodec import JSONCodec
+from .MultipartEncoder import MultipartEncoder
+from .RateLimiter import RateLimiter
+from .SingleFlight import SingleFlight, freeze, scope
+
+def query_params(params):
+    """
+    Converts a parameter dict into the str-only form aiohttp accepts,
+    dropping None values.
+    """
+    out = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = str(value).lower()
+        out[key] = str(value)
+    return out
+
+class AsyncCordraClient(object):
+    """
+    asyncio client for the REST interface of a Cordra instance.  Mirrors
+    CordraClient, but every call is a coroutine sent through one pooled
+    aiohttp session with a bound on the number of calls in flight.
+
+    Use as an async context manager, or call open() and close() directly:
+
+        async with AsyncCordraClient(host, username, password) as client:
+            obj = await client.retrieve(id)
+    """
+    def __init__(self, host, username=None, password=None, auth=None,
+                 cert=None, verify=True, pool_maxsize=10,
+                 max_concurrency=None, keep_alive=True, rate_limiter=None,
+                 concurrency_limiter=None, json_codec=None, coalesce=False):
+        """
+        Class initializer. Stores access information.  The session is
+        created and the credentials are checked by open().
+
+        Parameters
+        ----------
+        host : str
+            URL for the Cordra server.
+        username : str, optional
+            Username of desired account on the server. A prompt will ask
+            for the username if not given.
+        password : str, optional
+            Password of desired account on the server.  A prompt will ask
+            for the password if not given.
+        auth : tuple, optional
+            (username, password) tuple.  Alternative to giving username
+            and password seperately.
+        cert : str or tuple, optional
+            If str, path to ssl client cert file (.pem). If tuple,
+            ('cert', 'key') pair.
+        verify : bool or str, optional
+            Either a boolean, in which case it controls whether we verify
+            the server's TLS certificate, or a string, in which case it
+            must be a path to a CA bundle to use. Defaults to True.
+        pool_maxsize : int, optional
+            The maximum number of connections kept open to the host.
+            Defaults to 10.
+        max_concurrency : int, optional
+            The maximum number of calls in flight at once.  Defaults to
+            pool_maxsize.
+        keep_alive : bool, optional
+            If True (default), connections are reused between calls.
+        rate_limiter : RateLimiter or float, optional
+            Limits the rate of calls, or the number of calls per second for
+            a default RateLimiter.  Can be shared with other clients.
+            Default is no limit.
+        concurrency_limiter : ConcurrencyLimiter or bool, optional
+            Adaptively limits the number of calls in flight, within
+            max_concurrency.  If True, a default ConcurrencyLimiter is used.
+            Can be shared with other clients.  Default is no limit.
+        json_codec : JSONCodec or str, optional
+            The codec used for JSON bodies, or the name of its backend.
+            Default uses orjson or ujson if installed, else the json module.
+        coalesce : SingleFlight or bool, optional
+            If True, concurrent identical GET and HEAD calls share one
+            request and its decoded result, which callers should not
+            modify.  A SingleFlight can be given to share calls between
+            clients; only calls to the same host with the same auth are
+            shared.  Default is False.
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncCordraClient requires aiohttp: pip install aiohttp')
+
+        # Handle host
+        host = host.strip('/')
+
+        # Handle username and password
+        if auth is None:
+            if username is None:
+                username = input(f'Enter username for {host}:')
+            if username != '':
+                if password is None:
+                    password = getpass.getpass(f'Enter password for {username} @ {host}:')
+                auth = aiohttp.BasicAuth(username, password)
+            else:
+                username = None
+                auth = None
+        else:
+            assert username is None and password is None, 'auth cannot be given with username and password'
+            username = auth[0]
+            auth = aiohttp.BasicAuth(*auth)
+
+        # Handle certification
+        if cert is not None:
+            for certfile in aslist(cert):
+                if not Path(certfile).is_file():
+                    raise ValueError('Certification file not found!')
+
+        self.__host = host
+        self.__user = username
+        self.__auth = auth
+        self.__cert = cert
+        self.__verify = verify
+        self.__pool_maxsize = pool_maxsize
+        self.__max_concurrency = max_concurrency if max_concurrency is not None else pool_maxsize
+        self.__keep_alive = keep_alive
+        self.__session = None
+        self.__semaphore = None
+
+        if isinstance(rate_limiter, (int, float)) and not isinstance(rate_limiter, bool):
+            rate_limiter = RateLimiter(rate_limiter)
+        if concurrency_limiter is True:
+            concurrency_limiter = ConcurrencyLimiter()
+        elif concurrency_limiter is False:
+            concurrency_limiter = None
+        self.__rate_limiter = rate_limiter
+        self.__concurrency_limiter = concurrency_limiter
+        if not isinstance(json_codec, JSONCodec):
+            json_codec = JSONCodec(json_codec)
+        self.__json_codec = json_codec
+        self.coalesce = coalesce
+
+    def __str__(self):
+        """String representation."""
+        return f'AsyncCordraClient for {self.username} @ {self.host}'
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def host(self):
+        """str: The host url for the server."""
+        return self.__host
+
+    @property
+    def username(self):
+        """str: The username to use for the server."""
+        return self.__user
+
+    @property
+    def json_codec(self):
+        """JSONCodec: The codec used for JSON bodies."""
+        return self.__json_codec
+
+    @property
+    def coalesce(self):
+        """SingleFlight or None: Shares concurrent identical reads."""
+        return self.__coalesce
+
+    @coalesce.setter
+    def coalesce(self, value):
+        if value is True:
+            value = SingleFlight()
+        elif value is False:
+            value = None
+        self.__coalesce = value
+
+    def encode_json(self, obj):
+        """
+        Encodes a request body as JSON.
+
+        Parameters
+        ----------
+        obj : dict or object with a json() method
+            The object to encode.
+
+        Returns
+        -------
+        bytes
+            The UTF-8 JSON.
+        """
+        if hasattr(obj, 'json'):
+            return obj.json().encode('utf-8')
+        return self.__json_codec.dumps(obj)
+
+    @property
+    def cert(self):
+        """str or None: The certification information."""
+        return self.__cert
+
+    @property
+    def verify(self):
+        """bool: The verify setting for the database."""
+        return self.__verify
+
+    @property
+    def rate_limiter(self):
+        """RateLimiter or None: The limit on the rate of calls."""
+        return self.__rate_limiter
+
+    @property
+    def concurrency_limiter(self):
+        """ConcurrencyLimiter or None: The adaptive limit on calls in flight."""
+        return self.__concurrency_limiter
+
+    @property
+    def session(self):
+        """aiohttp.ClientSession or None: The pooled session, once opened."""
+        return self.__session
+
+    def ssl_context(self):
+        """
+        Builds the ssl setting for the connector from verify and cert.
+        """
+        if self.verify is True and self.cert is None:
+            return None
+
+        if isinstance(self.verify, str):
+            context = ssl.create_default_context(cafile=self.verify)
+        else:
+            context = ssl.create_default_context()
+            if not self.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+        if self.cert is not None:
+            context.load_cert_chain(*aslist(self.cert))
+
+        return context
+
+    async def open(self):
+        """
+        Creates the pooled session and checks the credentials.
+        """
+        connector = aiohttp.TCPConnector(limit=self.__pool_maxsize,
+                                         limit_per_host=self.__pool_maxsize,
+                                         force_close=not self.__keep_alive,
+                                         ssl=self.ssl_context())
+        self.__session = aiohttp.ClientSession(connector=connector, auth=self.__auth)
+        self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+
+        if self.username is not None:
+            await self.check_credentials()
+
+    async def close(self):
+        """
+        Closes the session and any pooled connections.
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def restrequest(self, method, rest_url, params=None, raw=False, **kwargs):
+        """
+        Sends a request through the pooled session.
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method.
+        rest_url : str
+            The REST command URL, i.e. URL path after host.
+        params : dict or list, optional
+            Query parameters.  For a dict, bool values are sent as
+            'true'/'false' and None values are dropped.
+        raw : bool or str, optional
+            Skip decoding the body: True or 'bytes' returns the body bytes,
+            'memoryview' a memoryview of them, and 'stream' the unread
+            aiohttp.ClientResponse, which the caller must release, e.g. with
+            "async with response".
+        **kwargs : any, optional
+            Any other arguments supported by aiohttp.ClientSession.request()
+            except for url.
+
+        Returns
+        -------
+        dict or str
+            The decoded JSON response or, if not JSON, the response text.
+            For raw, bytes, memoryview or aiohttp.ClientResponse.
+
+        Raises
+        ------
+        ValueError
+            If raw is not a known mode.
+        aiohttp.ClientResponseError
+            If the response code is not ok.
+        """
+        if raw not in (False, True, 'bytes', 'memoryview', 'stream'):
+            raise ValueError("raw must be one of (False, True, 'bytes', 'memoryview', 'stream')")
+        if self.__session is None:
+            raise RuntimeError('AsyncCordraClient is not open: use "async with" or await open()')
+
+        # Share concurrent identical reads
+        if (self.__coalesce is not None and method.lower() in ('get', 'head')
+                and raw != 'stream' and set(kwargs) <= {'headers'}):
+            key = (scope(self.host, self.__auth), method.lower(), rest_url, freeze(params),
+                   freeze(kwargs.get('headers')), raw)
+            return await self.__coalesce.do_async(
+                key, lambda: self.__restrequest(method, rest_url, params, raw, **kwargs))
+
+        return await self.__restrequest(method, rest_url, params, raw, **kwargs)
+
+    async def __restrequest(self, method, rest_url, params, raw, **kwargs):
+        """restrequest() after the arguments are checked."""
+        url = self.host + '/' + rest_url.lstrip('/')
+        if isinstance(params, dict):
+            params = query_params(params)
+
+        async with self.__semaphore:
+            # Wait for the rate and concurrency limits
+            if self.__rate_limiter is not None:
+                await self.__rate_limiter.acquire_async()
+            limiter = self.__concurrency_limiter
+            if limiter is not None:
+                start = await limiter.acquire_async()
+
+            try:
+                response = await self.__session.request(method, url, params=params,
+                                                        **kwargs)
+            except BaseException:
+                if limiter is not None:
+                    limiter.release(start, error=True)
+                raise
+            if limiter is not None:
+                limiter.release(start, status=response.status)
+
+            if raw == 'stream' and response.status < 400:
+                return response
+
+            async with response:
+                body = await response.read()
+
+                # Check for errors
+                if response.status >= 400:
+                    try:
+                        print(self.__json_codec.loads(body))
+                    except BaseException:
+                        print(body.decode('utf-8', errors='replace'))
+                    response.raise_for_status()
+
+                if raw == 'memoryview':
+                    return memoryview(body)
+                if raw:
+                    return body
+
+                # Decode by content type
+                content_type = response.headers.get('Content-Type')
+                if not body:
+                    return ''
+                if self.__json_codec.is_json(content_type):
+                    return self.__json_codec.loads(body)
+                if content_type is None:
+                    try:
+                        return self.__json_codec.loads(body)
+                    except ValueError:
+                        pass
+                return body.decode(response.get_encoding(), errors='replace')
+
+    async def check_credentials(self):
+        return await self.restrequest('get', 'check-credentials')
+
+    async def retrieve(self, id, jsonPointer=None, filter=None, payload=None,
+                       pretty=None, text=False, disposition=None, full=False,
+                       raw=False):
+        """
+        Retrieve an object or part of an object using its id.  Arguments
+        are the same as for CordraClient.retrieve().
+        """
+        params = {}
+        params['jsonPointer'] = jsonPointer
+        if filter is not None and not isinstance(filter, str):
+            filter = self.encode_json(list(filter)).decode('utf-8')
+        params['filter'] = filter
+        params['payload'] = payload
+        params['pretty'] = pretty
+        if text:
+            params['text'] = text
+        params['disposition'] = disposition
+        if full:
+            params['full'] = full
+
+        return await self.restrequest('get', f'objects/{id}', params=params, raw=raw)
+
+    async def retrieve_payload_info(self, id):
+        """
+        Retrieve the list of payload descriptions for an object.
+
+        Parameters
+        ----------
+        id : str
+            The id of the object.
+
+        Returns
+        -------
+        list of dict
+            The name, filename, mediaType and size of each payload.
+        """
+        r = await self.retrieve(id, full=True)
+        return r.get('payloads', [])
+
+    async def retrieve_payload(self, id, payload):
+        """
+        Retrieve a payload by object id and payload name.
+
+        Parameters
+        ----------
+        id : str
+            The id of the object.
+        payload : str
+            The name of the payload.
+        """
+        return await self.retrieve(id, payload=payload)
+
+    def build_form(self, obj=None, acls=None, payloads=None):
+        """
+        Builds the multipart form for content, acl and payloads.
+
+        Returns
+        -------
+        form : aiohttp.FormData
+        handles : list
+            Opened payload file handles, to be closed after sending.
+        """
+        form = aiohttp.FormData()
+        if obj is not None:
+            form.add_field('content', self.encode_json(obj).decode('utf-8'))
+        if acls is not None:
+            form.add_field('acl', self.encode_json(acls).decode('utf-8'))
+
+        if not isinstance(payloads, dict):
+            payloads = payloads.json()
+        handles = []
+        for name, (filename, handle) in payloads.items():
+            form.add_field(name, handle, filename=filename)
+            handles.append(handle)
+
+        return form, handles
+
+    async def create(self, obj, obj_type, payloads=None, dryrun=False,
+                     acls=None, suffix=None, handle=None, full=False):
+        """
+        Create a new object.  Arguments are the same as for
+        CordraClient.create().
+        """
+        params = {}
+        params['type'] = obj_type
+        if dryrun:
+            params['dryRun'] = dryrun
+        params['suffix'] = suffix
+        params['handle'] = handle
+        if full:
+            params['full'] = full
+
+        if payloads:
+            form, handles = self.build_form(obj, acls, payloads)
+            try:
+                return await self.restrequest('post', 'objects', params=params, data=form)
+            finally:
+                for h in handles:
+                    h.close()
+
+        elif acls:
+            # Send acls with the content in one multipart body
+            with MultipartEncoder(fields={'content': self.encode_json(obj),
+                                          'acl': self.encode_json(acls)}) as encoder:
+                data = encoder.read()
+                content_type = encoder.content_type
+            return await self.restrequest('post', 'objects', params=params, data=data,
+                                          headers={'Content-Type': content_type})
+
+        else:
+            return await self.restrequest('post', 'objects', params=params,
+                                          data=self.encode_json(obj),
+                                          headers={'Content-Type': 'application/json'})
+
+    async def update(self, id, obj=None, jsonPointer=None, obj_type=None,
+                     dryrun=False, full=False, payloads=None,
+                     payloadToDelete=None, acls=None):
+        """
+        Update an object's content, payloads and/or acls.
+
+        Parameters
+        ----------
+        id : str
+            The id of the object to update.
+        obj : dict, optional
+            The new content.  If jsonPointer is given, the new value for
+            that subcomponent.  Required unless only acls are updated.
+        jsonPointer : str, optional
+            Restricts the update to the subcomponent at the jsonPointer.
+        obj_type : str, optional
+            Changes the type of the object.
+        dryrun : bool, optional
+            Do not actually update the object.
+        full : bool, optional
+            If True, the full Cordra object is returned.
+        payloads : Payloads or dict, optional
+            Payloads to add or replace.  Requires obj.
+        payloadToDelete : str or list, optional
+            Name(s) of payloads to delete.
+        acls : dict, optional
+            New acls.  Sent with obj in the same request, or alone if obj
+            is not given.
+        """
+        params = {}
+        params['type'] = obj_type
+        if dryrun:
+            params['dryRun'] = dryrun
+        if full:
+            params['full'] = full
+        params['jsonPointer'] = jsonPointer
+
+        # payloadToDelete may repeat, so use a list of pairs
+        params = list(query_params(params).items())
+        for name in aslist(payloadToDelete) if payloadToDelete is not None else []:
+            params.append(('payloadToDelete', name))
+
+        if payloads:
+            if obj is None:
+                raise ValueError('obj is required when updating payloads')
+            form, handles = self.build_form(obj, acls, payloads)
+            try:
+                return await self.restrequest('put', f'objects/{id}', params=params, data=form)
+            finally:
+                for h in handles:
+                    h.close()
+
+        elif obj is None:
+            if acls is None:
+                raise ValueError('obj or acls is required')
+            return await self.update_acls(id, acls)
+
+        elif acls:
+            # Send acls with the content in one multipart body
+            with MultipartEncoder(fields={'content': self.encode_json(obj),
+                                          'acl': self.encode_json(acls)}) as encoder:
+                data = encoder.read()
+                content_type = encoder.content_type
+            return await self.restrequest('put', f'objects/{id}', params=params, data=data,
+                                          headers={'Content-Type': content_type})
+
+        else:
+            return await self.restrequest('put', f'objects/{id}', params=params,
+                                          data=self.encode_json(obj),
+                                          headers={'Content-Type': 'application/json'})
+
+    async def update_acls(self, id, acls):
+        """
+        Replace the acls of an object.
+
+        Parameters
+        ----------
+        id : str
+            The id of the object.
+        acls : dict
+            The new acls, e.g. {"readers": [...], "writers": [...]}.
+        """
+        return await self.restrequest('put', f'acls/{id}', data=self.encode_json(acls),
+                                      headers={'Content-Type': 'application/json'})
+
+    async def find(self, query, ids=False, jsonFilter=None, full=False,
+                   pageNum=None, pageSize=None, sortFields=None, raw=False):
+        '''
+        Find a Cordra object by query.  Give raw as for restrequest() to
+        get the undecoded search response.
+        '''
+        params = dict()
+        params['query'] = query
+        params['full'] = full
+
+        if jsonFilter:
+            if not isinstance(jsonFilter, str):
+                jsonFilter = self.encode_json(list(jsonFilter)).decode('utf-8')
+            params['filter'] = jsonFilter
+
+        if ids:
+            params['ids'] = True
+
+        if pageNum is not None:
+            params['pageNum'] = pageNum
+        if pageSize is not None:
+            params['pageSize'] = pageSize
+        if sortFields is not None:
+            params['sortFields'] = sortFields
+
+        return await self.restrequest('get', 'objects', params=params, raw=raw)
+
+    async def delete(self, obj_id, jsonPointer=None):
+        '''Delete a Cordra object'''
+        params = {}
+        if jsonPointer:
+            params['jsonPointer'] = jsonPointer
+
+        return await self.restrequest('delete', f'objects/{obj_id}', params=params)
@@ -0,0 +1,166 @@
+import threading
+import time
+
+class ConcurrencyLimiter():
+    """
+    Thread-safe adaptive limit on the number of calls in flight, using
+    additive increase / multiplicative decrease (AIMD).  The limit grows by
+    about one per round trip while calls succeed with a latency close to
+    the long-term average, and is cut by a factor when the server answers
+    429 or 5xx, a call fails to connect, or latency rises past a tolerance
+    of that average.
+    """
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0,
+                 decrease=0.5, latency_tolerance=2.0, smoothing=0.05):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        initial : int, optional
+            The starting limit. Default value is 4.
+        min_limit : int, optional
+            The lowest the limit can go. Default value is 1.
+        max_limit : int, optional
+            The highest the limit can go. Default value is 64.
+        increase : float, optional
+            How much the limit grows per round of successful calls. Default
+            value is 1.
+        decrease : float, optional
+            The factor the limit is multiplied by on overload. Default value
+            is 0.5.
+        latency_tolerance : float, optional
+            A call slower than this multiple of the baseline latency counts
+            as overload. Default value is 2.
+        smoothing : float, optional
+            The weight of each call in the moving average of latency that
+            serves as the baseline. Default value is 0.05.
+        """
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1')
+        
+        self.__limit = float(min(max(initial, min_limit), max_limit))
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__increase = increase
+        self.__decrease = decrease
+        self.__latency_tolerance = latency_tolerance
+        self.__smoothing = smoothing
+        
+        self.__inflight = 0
+        self.__baseline = None
+        self.__last_decrease = 0.0
+        self.__condition = threading.Condition()
+    
+    @property
+    def limit(self):
+        """int: The current number of calls allowed in flight."""
+        return max(self.__min_limit, int(self.__limit))
+    
+    @property
+    def inflight(self):
+        """int: The number of calls currently in flight."""
+        return self.__inflight
+    
+    @property
+    def baseline(self):
+        """float or None: The average latency in seconds."""
+        return self.__baseline
+    
+    def try_acquire(self):
+        """
+        Takes a slot if one is free.
+        
+        Returns
+        -------
+        float or None
+            The start time of the call to pass to release(), or None if the
+            limit is reached.
+        """
+        with self.__condition:
+            if self.__inflight >= self.limit:
+                return None
+            self.__inflight += 1
+            return time.monotonic()
+    
+    def acquire(self):
+        """
+        Blocks until a slot is free and takes it.
+        
+        Returns
+        -------
+        float
+            The start time of the call to pass to release().
+        """
+        with self.__condition:
+            while self.__inflight >= self.limit:
+                self.__condition.wait()
+            self.__inflight += 1
+            return time.monotonic()
+    
+    async def acquire_async(self, poll=0.005):
+        """
+        Waits without blocking the event loop until a slot is free and
+        takes it.
+        
+        Parameters
+        ----------
+        poll : float, optional
+            The initial wait between checks, doubled up to 50 ms. Default
+            value is 0.005.
+        
+        Returns
+        -------
+        float
+            The start time of the call to pass to release().
+        """
+        # asyncio is slow to import and only needed here
+        import asyncio
+
+        while True:
+            start = self.try_acquire()
+            if start is not None:
+                return start
+            await asyncio.sleep(poll)
+            poll = min(2 * poll, 0.05)
+    
+    def release(self, start, status=None, error=False):
+        """
+        Frees a slot and adapts the limit to the outcome of the call.
+        
+        Parameters
+        ----------
+        start : float
+            The value returned by acquire().
+        status : int, optional
+            The response status code.
+        error : bool, optional
+            True if the call failed without a response.
+        """
+        now = time.monotonic()
+        latency = now - start
+        
+        with self.__condition:
+            self.__inflight -= 1
+            
+            overload = error or status == 429 or (status is not None and status >= 500)
+            if not overload and self.__baseline is not None:
+                overload = latency > self.__latency_tolerance * self.__baseline
+            
+            if overload:
+                # Only calls started after the last cut can cut again
+                if start > self.__last_decrease:
+                    self.__limit = max(self.__min_limit, self.__limit * self.__decrease)
+                    self.__last_decrease = now
+            else:
+                self.__limit = min(self.__max_limit,
+                                   self.__limit + self.__increase / self.__limit)
+            
+            # Track the long-term average latency
+            if not error:
+                if self.__baseline is None:
+                    self.__baseline = latency
+                else:
+                    self.__baseline += self.__smoothing * (latency - self.__baseline)
+            
+            self.__condition.notify_all()
@@ -1,23 +1,179 @@
-import json
+from pathlib import Path
+import re
+from urllib.parse import quote_plus
+
+import requests
 from .RestClient import RestClient
-from lucenequerybuilder import Q
+from .SingleFlight import scope
+from .bulk import BulkResult, bulk_map
+from .FindIterator import FindIterator
+from .LazyObject import LazyObject, escape_pointer
+from .MultipartEncoder import MultipartEncoder
+from .ObjectCache import ObjectCache
+from .TokenAuth import TokenAuth
+
+def quote_term(value):
+    """Quotes a value as a Lucene phrase."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def id_chunks(ids, max_ids, max_query_length):
+    """Splits ids into chunks whose OR'ed id query fits the limits."""
+    chunk, length = [], 0
+    for id in ids:
+        n = len(quote_plus(f'id:{quote_term(id)}')) + len(quote_plus(' OR '))
+        if chunk and (len(chunk) >= max_ids or length + n > max_query_length):
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(id)
+        length += n
+    if chunk:
+        yield chunk
+
+def json_diff(old, new, pointer=''):
+    """
+    Lists the jsonPointer writes that turn old into new: ('put', pointer,
+    value) replaces or adds a value and ('delete', pointer) removes one.
+    Dicts are compared key by key and lists of equal length item by item;
+    anything else that differs is replaced whole.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = [('delete', f'{pointer}/{escape_pointer(key)}')
+                   for key in old if key not in new]
+        for key, value in new.items():
+            child = f'{pointer}/{escape_pointer(key)}'
+            if key in old:
+                changes.extend(json_diff(old[key], value, child))
+            else:
+                changes.append(('put', child, value))
+        return changes
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        changes = []
+        for index, (a, b) in enumerate(zip(old, new)):
+            changes.extend(json_diff(a, b, f'{pointer}/{index}'))
+        return changes
+    if type(old) is type(new) and old == new:
+        return []
+    return [('put', pointer, new)]
 
 class CordraClient(RestClient):
 
+    def __init__(self, host, username=None, password=None, cache=None,
+                 use_token=False, token_lifetime=1800, **kwargs):
+        """
+        Class initializer. Tests and stores access information.
+
+        Parameters
+        ----------
+        host: str
+            URL for the Cordra server.
+        username: str, optional
+            Username of desired account on the server. A prompt will ask for
+            the username if not given.
+        password: str, optional
+            Password of desired account on the server.  A prompt will ask
+            for the password if not given.
+        cache: ObjectCache or bool, optional
+            Cache for retrieve() responses.  If True, an ObjectCache with
+            default settings is used.  Default is no cache.
+        use_token: bool, optional
+            If True, a bearer token is obtained at login and sent with all
+            calls instead of the password.  It is refreshed before it
+            expires and revoked by close().  Default is False.
+        token_lifetime: float, optional
+            Seconds a token stays valid after its last use, matching the
+            server's session timeout.  Default value is 1800.
+        **kwargs: any, optional
+            Any other RestClient arguments, e.g. auth, verify or
+            pool_maxsize.
+        """
+        self.cache = cache
+        self.__use_token = use_token
+        self.__token_lifetime = token_lifetime
+        self.__token_auth = None
+        super().__init__(host, username=username, password=password, **kwargs)
+
     def __str__(self):
         """String representation."""
         return f'CordraClient for {self.username} @ {self.host}'
 
+    def endpoint(self, rest_url):
+        """
+        Gives the name that calls to a REST URL are grouped under in
+        metrics: the first segment of the path, or the first two for auth
+        calls, e.g. 'objects', 'acls' or 'auth/token'.
+        """
+        parts = rest_url.strip('/').split('/')
+        if parts[0] == 'auth' and len(parts) > 1:
+            return '/'.join(parts[:2])
+        return parts[0]
+
     def testcall(self):
         """
         Simple rest call to check if authentication parameters are valid.
         """
+        # Replace the password with a token
+        if self.__use_token and isinstance(self.auth, tuple):
+            if self.__token_auth is not None:
+                self.__token_auth.revoke()
+            self.__token_auth = TokenAuth(self, *self.auth,
+                                          lifetime=self.__token_lifetime)
+            self.__token_auth.acquire()
+            self.auth = self.__token_auth
+
         # Call check_credentials()
         self.check_credentials()
 
+    def close(self):
+        """
+        Revokes any bearer token, then closes the session and any pooled
+        connections.
+        """
+        try:
+            if self.__token_auth is not None:
+                self.__token_auth.revoke()
+        finally:
+            super().close()
+
+    @property
+    def cache(self):
+        """ObjectCache or None: The cache for retrieve() responses."""
+        return self.__cache
+
+    @cache.setter
+    def cache(self, value):
+        if value is True:
+            value = ObjectCache()
+        elif value is False:
+            value = None
+        self.__cache = value
+
+    def invalidate(self, id):
+        """
+        Drop any cached responses for an object.
+
+        Parameters
+        ----------
+        id: str
+            The id of the object.
+        """
+        if self.__cache is not None:
+            self.__cache.invalidate(id)
+
+    def __write(self, id, send):
+        """
+        Calls send() to write an object, dropping its cached responses
+        before and after, as a retrieve running during the write can cache
+        the old version again.
+        """
+        self.invalidate(id)
+        try:
+            return send()
+        finally:
+            self.invalidate(id)
 
     def retrieve(self, id, jsonPointer=None, filter=None, payload=None,
-                 pretty=None, text=False, disposition=None, full=False):
+                 pretty=None, text=False, disposition=None, full=False,
+                 raw=False):
         """
         Retrieve an object or part of an object using its id.
 
@@ -27,8 +183,8 @@ class CordraClient(RestClient):
             The id of the desired object.
         jsonPointer: str, optional
             The jsonPointer into the subcomponent of the target object
-        filter: list? str?, optional
-            A json array of jsonPointers used to restrict the result object
+        filter: list or str, optional
+            A list, or json array, of jsonPointers used to restrict the result object
         payload: str, optional
             The name of the payload to retrieve
         pretty: str (bool?), optional
@@ -44,6 +200,12 @@ class CordraClient(RestClient):
             If present the response is the full Cordra object, including properties id,
             type, content, acl, metadata, and payloads. By default only the content is
             returned.)
+        raw: bool or str, optional
+            Return the response undecoded: True or 'bytes' for the body
+            bytes, 'memoryview' for a memoryview of it, or 'stream' for the
+            unread requests.Response, which the caller must close.  Cached
+            bodies are returned as they are for True, 'bytes' and
+            'memoryview'; 'stream' always calls the server.
         """
         # Set the rest URL
         rest_url = f'objects/{id}'
@@ -53,6 +215,8 @@ class CordraClient(RestClient):
         if jsonPointer is not None:
             params['jsonPointer'] = jsonPointer
         if filter is not None:
+            if not isinstance(filter, str):
+                filter = self.json_codec.dumps(list(filter)).decode('utf-8')
             params['filter'] = filter
         if payload is not None:
             params['payload'] = payload
@@ -65,26 +229,245 @@ class CordraClient(RestClient):
         if full:
             params['full'] = full
         
-        return self.restget(rest_url, params=params)
+        if raw not in self.raw_modes:
+            raise ValueError(f'raw must be one of {self.raw_modes}')
+        if (self.__cache is None or payload is not None or disposition is not None
+                or raw == 'stream'):
+            return self.restget(rest_url, params=params, raw=raw)
+
+        # Serve from the cache, revalidating stale entries
+        key = (id,) + tuple(sorted((k, str(v)) for k, v in params.items()))
+        entry, fresh = self.__cache.get(key)
+        headers = {}
+        if entry is not None:
+            if fresh:
+                return self.__cached_body(entry.body, entry.content_type, rest_url, raw)
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        def fetch():
+            response = self.restresponse('get', rest_url, params=params, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                self.__cache.revalidated(key)
+                return entry.body, entry.content_type
+
+            content_type = response.headers.get('Content-Type')
+            self.__cache.put(key, response.content, etag=response.headers.get('ETag'),
+                             last_modified=response.headers.get('Last-Modified'),
+                             content_type=content_type)
+            return response.content, content_type
+
+        # Concurrent misses share one fetch, but each caller decodes its own copy
+        if self.coalesce is not None:
+            body, content_type = self.coalesce.do(
+                ('retrieve', scope(self.host, self.auth)) + key, fetch)
+        else:
+            body, content_type = fetch()
+        return self.__cached_body(body, content_type, rest_url, raw)
+
+    def retrieve_lazy(self, id, hint=None):
+        """
+        Returns a read-only mapping of an object's content that retrieves
+        top-level fields only when first accessed.  Useful for objects with
+        large fields that are rarely read.
+
+        Parameters
+        ----------
+        id: str
+            The id of the object.
+        hint: list of str, optional
+            Top-level fields likely to be accessed together.  They are
+            fetched in one filtered request on the first access to any
+            field.
+
+        Returns
+        -------
+        LazyObject
+        """
+        return LazyObject(self, id, hint=hint)
+
+    def __cached_body(self, body, content_type, rest_url, raw):
+        """Returns a cached body as restrequest() would for raw."""
+        if raw == 'memoryview':
+            return memoryview(body)
+        if raw:
+            return body
+        return self.decode_body(body, content_type, rest_url)
 
     
+    def download_payload(self, id, payload, dest, chunk_size=2**20,
+                         resume=False, max_workers=1, part_size=2**26):
+        """
+        Download a payload, streaming it in chunks to a file or buffer
+        instead of reading it into memory.
+
+        Parameters
+        ----------
+        id: str
+            The id of the object.
+        payload: str
+            The name of the payload.
+        dest: str, Path or file-like
+            The path to save the payload to, or an object with a write()
+            method, e.g. an open file or io.BytesIO.
+        chunk_size: int, optional
+            The number of bytes read from the connection at a time.
+            Default value is 1 MiB.
+        resume: bool, optional
+            If True and dest is an existing file, only the missing end of
+            the payload is requested with an HTTP Range header and appended.
+            Ignored unless dest is a path and max_workers is 1.
+        max_workers: int, optional
+            If more than 1 and dest is a path, the payload is split into
+            byte ranges of part_size that are downloaded in parallel.  The
+            data is written to dest with a '.part' suffix and renamed once
+            complete.  Default value is 1.
+        part_size: int, optional
+            The size of the byte ranges for parallel downloads.  Default
+            value is 64 MiB.
+
+        Returns
+        -------
+        int
+            The number of bytes written.
+        """
+        rest_url = f'objects/{id}'
+        params = {'payload': payload}
+
+        def write(response, f):
+            size = 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+            return size
+
+        # Stream to a buffer
+        if not isinstance(dest, (str, Path)):
+            with self.restresponse('get', rest_url, params=params, stream=True) as response:
+                return write(response, dest)
+
+        dest = Path(dest)
+
+        # Download byte ranges in parallel
+        if max_workers > 1:
+            total = self.payload_size(id, payload)
+            if total is not None and total > part_size:
+                return self.__download_parts(rest_url, params, dest, total,
+                                             chunk_size, max_workers, part_size)
+
+        # Stream to a file, resuming from its current end
+        offset = dest.stat().st_size if resume and dest.is_file() else 0
+        # Ranges count bytes of the payload as stored, so ask for it unencoded
+        headers = {'Accept-Encoding': 'identity'}
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+        try:
+            response = self.restresponse('get', rest_url, params=params,
+                                         headers=headers, stream=True, quiet=(416,))
+        except requests.HTTPError as e:
+            # Range starts at the end: the file is already complete
+            if offset > 0 and e.response is not None and e.response.status_code == 416:
+                return 0
+            raise
+
+        with response:
+            # A server ignoring the Range header sends the whole payload
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(dest, mode) as f:
+                return write(response, f)
+
+    def payload_size(self, id, payload):
+        """
+        Get the size of a payload with a one byte Range request.
+
+        Parameters
+        ----------
+        id: str
+            The id of the object.
+        payload: str
+            The name of the payload.
+
+        Returns
+        -------
+        int or None
+            The size in bytes, or None if the server does not support
+            Range requests for the payload.
+        """
+        with self.restresponse('get', f'objects/{id}', params={'payload': payload},
+                               headers={'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'},
+                               stream=True) as response:
+            if response.status_code != 206:
+                return None
+            match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+            if match is None:
+                return None
+            return int(match.group(1))
+
+    def __download_parts(self, rest_url, params, dest, total, chunk_size,
+                         max_workers, part_size):
+        """Downloads byte ranges of a payload in parallel into dest."""
+        part = dest.with_name(dest.name + '.part')
+        with open(part, 'wb') as f:
+            f.truncate(total)
+
+        def download(start):
+            end = min(start + part_size, total) - 1
+            headers = {'Range': f'bytes={start}-{end}', 'Accept-Encoding': 'identity'}
+            with self.restresponse('get', rest_url, params=params,
+                                   headers=headers, stream=True) as response:
+                if response.status_code != 206:
+                    raise requests.HTTPError(f'Range request not honored: {response.status_code}')
+                with open(part, 'r+b') as f:
+                    f.seek(start)
+                    size = 0
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            if size != end + 1 - start:
+                raise IOError(f'incomplete range {start}-{end}: {size} bytes')
+            return size
+
+        results = bulk_map(download, range(0, total, part_size),
+                           max_workers=max_workers, ordered=False)
+        for result in results:
+            if result.error is not None:
+                raise result.error
+        part.replace(dest)
+
+        return total
+
     def create(self, obj, obj_type, payloads=None, dryrun=False,
-               acls=None, suffix=None, handle=None, full=False):
+               acls=None, suffix=None, handle=None, full=False, progress=None,
+               exist_ok=False):
         """
         obj
         obj_type: str
             The type of the object being created. In this case “Document”.
+        payloads: Payloads or dict, optional
+            Payloads to upload with the object.  Payloads are streamed from
+            their files in chunks.  A dict is passed to requests as files.
         dryrun: bool, optional
             Do not actually create the object. Will return results as if object had been created.
+        acls: dict, optional
+            The acls of the object, e.g. {"readers": [...], "writers": [...]}.  Sent
+            with the content in the same request.
         suffix: str, optional
             The suffix of the handle used to identify this object. One will be generated if
             neither ‘suffix’ nor ‘handle’ is specified.
         handle: str, optional
             The handle used to identify this object. One will be generated if neither ‘suffix’
-            nor ‘handle’ is specified.
+            nor ‘handle’ is specified.  Giving a suffix or handle allows the client's retry
+            policy to safely retry the create.
         full bool, optional
             If present the response is the full Cordra object, including properties id, type,
             content, acl, metadata, and payloads. By default only the content is returned.
+        progress: callable, optional
+            Called as progress(bytes_sent, total) while Payloads are uploaded.
+        exist_ok: bool, optional
+            If True, None is returned instead of raising an error when an
+            object with the suffix or handle already exists.
         """
         params = {}
         params['type'] = obj_type
@@ -97,72 +480,514 @@ class CordraClient(RestClient):
         if full:
             params['full'] = full
 
-        if payloads:
-            data = {}
+        # Objects found to exist already are expected with exist_ok
+        quiet = (409,) if exist_ok else False
+
+        def send():
+            if payloads:
+                data = {}
             
-            # Convert obj to json
-            if isinstance(obj, dict):
-                data['content'] = json.dumps(obj)
-            else:
-                data['content'] = obj.json()
+                # Convert obj to json
+                if isinstance(obj, dict):
+                    data['content'] = self.encode_json(obj, 'objects')
+                else:
+                    data['content'] = obj.json()
+
+                # Convert acls to json
+                if acls is None:
+                    pass
+                elif isinstance(acls, dict):
+                    data['acl'] = self.encode_json(acls, 'objects')
+                else:
+                    data['acl'] = acls.json()
+
+                # Send files given as a dict as they are
+                if isinstance(payloads, dict):
+                    return self.restpost('objects', params=params, data=data, files=payloads,
+                                         quiet=quiet)
+
+                # Stream Payloads without buffering the files
+                with payloads.encoder(content=data['content'], acl=data.get('acl'),
+                                      callback=progress) as encoder:
+                    return self.restpost('objects', params=params, data=encoder,
+                                         headers={'Content-Type': encoder.content_type},
+                                         quiet=quiet)
 
-            # Convert acls to json
-            if acls is None:
-                pass
-            elif isinstance(acls, dict):
-                data['acl'] = json.dumps(acls)
             else:
-                data['acl'] = acls.json()
+                # Convert obj to json
+                if isinstance(obj, dict):
+                    data = self.encode_json(obj, 'objects')
+                else:
+                    data = obj.json()
+                headers = None
 
-            # Convert payloads to json
-            if not isinstance(payloads, dict):
-                payloads = payloads.json()
+                # Send acls with the content in one multipart body so that the
+                # object never exists with default acls
+                if acls:
+                    if isinstance(acls, dict):
+                        acl = self.encode_json(acls, 'objects')
+                    else:
+                        acl = acls.json()
+                    with MultipartEncoder(fields={'content': data, 'acl': acl}) as encoder:
+                        data = encoder.read()
+                        headers = {'Content-Type': encoder.content_type}
 
-            return self.restpost('objects', params=params, data=data, files=payloads)
+                return self.restpost('objects', params=params, data=data, headers=headers,
+                                     idempotent=handle is not None or suffix is not None,
+                                     quiet=quiet)
 
-        else:
-            if acls:
-                params['full'] = True
-            
-            # Convert obj to json
-            if isinstance(obj, dict):
-                data = json.dumps(obj)
+        try:
+            if handle is not None and not dryrun:
+                return self.__write(handle, send)
+            return send()
+        except requests.HTTPError as e:
+            if exist_ok and e.response is not None and e.response.status_code == 409:
+                return None
+            raise
+
+    def create_many(self, objs, obj_type, max_workers=None, ordered=True,
+                    **kwargs):
+        """
+        Create many objects in parallel.  The calls share the client's
+        pooled connections.
+
+        Parameters
+        ----------
+        objs: iterable
+            The objects to create.  Each item is either an object as
+            accepted by create(), or an (obj, kwargs) tuple where kwargs is
+            a dict of per-object create() arguments, e.g. suffix, handle,
+            acls or payloads.  Consumed lazily.
+        obj_type: str
+            The type of the objects being created.
+        max_workers: int, optional
+            The number of worker threads.  Defaults to pool_maxsize.
+        ordered: bool, optional
+            If True (default), results are yielded in input order,
+            otherwise in order of completion.
+        **kwargs: any, optional
+            create() arguments shared by all objects.
+
+        Yields
+        ------
+        BulkResult
+            The index, input item, create() response and any error of each
+            object.  A failure does not stop the remaining objects.
+        """
+        def create(item):
+            if isinstance(item, tuple):
+                obj, item_kwargs = item
+                item_kwargs = {**kwargs, **item_kwargs}
             else:
-                data = obj.json()
-            obj_r = self.restpost('objects',  params=params, data=data)
+                obj, item_kwargs = item, kwargs
+            return self.create(obj, obj_type, **item_kwargs)
 
-            if acls and not dryrun:
+        if max_workers is None:
+            max_workers = self.pool_maxsize
+        return bulk_map(create, objs, max_workers=max_workers, ordered=ordered)
 
-                # Convert acls to json
-                if isinstance(acls, dict):
-                    data['acl'] = json.dumps(acls)
+    def retrieve_many(self, ids, max_workers=None, ordered=True, **kwargs):
+        """
+        Retrieve many objects in parallel.  The calls share the client's
+        pooled connections.
+
+        Parameters
+        ----------
+        ids: iterable of str
+            The ids of the objects to retrieve.  Consumed lazily.
+        max_workers: int, optional
+            The number of worker threads.  Defaults to pool_maxsize.
+        ordered: bool, optional
+            If True (default), results are yielded in input order,
+            otherwise in order of completion.
+        **kwargs: any, optional
+            retrieve() arguments shared by all objects, e.g. full.
+
+        Yields
+        ------
+        BulkResult
+            The index, id, retrieve() response and any error of each
+            object.  A failure does not stop the remaining objects.
+        """
+        if max_workers is None:
+            max_workers = self.pool_maxsize
+        return bulk_map(lambda id: self.retrieve(id, **kwargs), ids,
+                        max_workers=max_workers, ordered=ordered)
+
+    def retrieve_batch(self, ids, filter=None, full=False, max_ids=500,
+                       max_query_length=4000, max_workers=None, fallback=True):
+        """
+        Retrieve many objects with a few searches instead of a request per
+        object.  The ids are packed into OR'ed id queries, each kept under
+        max_ids clauses and max_query_length characters once URL-encoded.
+
+        Parameters
+        ----------
+        ids: iterable of str
+            The ids of the objects to retrieve.
+        filter: list or str, optional
+            A list, or json array, of jsonPointers used to restrict the
+            result objects, as for retrieve().
+        full: bool, optional
+            If True, full Cordra objects are returned instead of content.
+        max_ids: int, optional
+            The most ids per search. Default value is 500, below Lucene's
+            default limit of 1024 clauses.
+        max_query_length: int, optional
+            The most URL-encoded characters per query. Default value is
+            4000, leaving room in the 8 KB request line most servers
+            accept.
+        max_workers: int, optional
+            The number of searches sent at once.  Defaults to pool_maxsize.
+        fallback: bool, optional
+            If True (default), ids missing from the search results are
+            retrieved one at a time, in case the index has not caught up
+            with them yet.
+
+        Returns
+        -------
+        dict
+            The objects by id, in input order.  Ids of objects that do not
+            exist map to None, as do ids missing from the searches if
+            fallback is False.
+        """
+        ids = list(dict.fromkeys(ids))
+
+        # Search full objects so that results can be matched to ids
+        pointers = None
+        if filter is not None:
+            if isinstance(filter, str):
+                filter = self.json_codec.loads(filter)
+            pointers = [p if full else '/content' + p for p in filter]
+            if '/id' not in pointers:
+                pointers.append('/id')
+
+        def search(chunk):
+            query = ' OR '.join(f'id:{quote_term(id)}' for id in chunk)
+            r = self.find(query, full=True, jsonFilter=pointers, pageSize=len(chunk))
+            return r['results']
+
+        found = {}
+        if max_workers is None:
+            max_workers = self.pool_maxsize
+        for result in bulk_map(search, id_chunks(ids, max_ids, max_query_length),
+                               max_workers=max_workers):
+            if result.error is not None:
+                raise result.error
+            for obj in result.result:
+                id = obj.get('id')
+                if full:
+                    # Results may be shared with coalesced callers
+                    if filter is not None and '/id' not in filter:
+                        obj = {k: v for k, v in obj.items() if k != 'id'}
                 else:
-                    data['acl'] = acls.json()
-                
-                acl_r = self.restput(f'acls/{obj_r["id"]}', params=params, data=data)
-                return [obj_r, acl_r]
+                    obj = obj.get('content', {})
+                found[id] = obj
+
+        missing = [id for id in ids if id not in found]
+        if fallback and missing:
+            for result in self.retrieve_many(missing, max_workers=max_workers,
+                                             filter=filter, full=full):
+                if result.error is None:
+                    found[result.item] = result.result
+                elif getattr(result.error, 'response', None) is None \
+                        or result.error.response.status_code != 404:
+                    raise result.error
+
+        return {id: found.get(id) for id in ids}
+
+    def delete_many(self, ids, max_workers=None, ordered=True):
+        """
+        Delete many objects in parallel.  The calls share the client's
+        pooled connections.
+
+        Parameters
+        ----------
+        ids: iterable of str
+            The ids of the objects to delete.  Consumed lazily.
+        max_workers: int, optional
+            The number of worker threads.  Defaults to pool_maxsize.
+        ordered: bool, optional
+            If True (default), results are yielded in input order,
+            otherwise in order of completion.
+
+        Yields
+        ------
+        BulkResult
+            The index, id, delete() response and any error of each
+            object.  A failure does not stop the remaining objects.
+        """
+        if max_workers is None:
+            max_workers = self.pool_maxsize
+        return bulk_map(self.delete, ids, max_workers=max_workers,
+                        ordered=ordered)
+
+    def batch_upload(self, objs, obj_type=None, max_count=1000,
+                     max_bytes=10*2**20, failFast=False, parallel=True):
+        """
+        Create or update many objects through Cordra's batchUpload endpoint,
+        sending up to max_count objects in one request.
+
+        Parameters
+        ----------
+        objs: iterable
+            The objects to upload.  Consumed lazily.  If obj_type is None,
+            each item is a full Cordra object dict with type and content,
+            and optionally id and acl.  If obj_type is given, each item is
+            the object content, or a (content, kwargs) tuple where kwargs
+            may give the object's handle and acls.
+        obj_type: str, optional
+            The type of all objects when only content is given.
+        max_count: int, optional
+            The maximum number of objects in one request. Default value is
+            1000.
+        max_bytes: int, optional
+            The maximum size of the encoded objects in one request.  An
+            object larger than this is sent in a request of its own.
+            Default value is 10 MiB.
+        failFast: bool, optional
+            If True, the server stops processing a batch at its first
+            failure.  Unprocessed objects are reported as errors.
+        parallel: bool, optional
+            If True (default), the server processes a batch in parallel.
+
+        Yields
+        ------
+        BulkResult
+            The index, input item, server response and any error of each
+            object, in input order.  Failures, including a failed request
+            for a whole batch, are reported per object.
+        """
+        params = {}
+        params['failFast'] = failFast
+        params['parallel'] = parallel
+
+        def encode(item):
+            if obj_type is None:
+                return self.encode_json(item, 'batchUpload')
+            if isinstance(item, tuple):
+                content, item_kwargs = item
             else:
-                return obj_r
+                content, item_kwargs = item, {}
+            full = {'type': obj_type, 'content': content}
+            if item_kwargs.get('handle') is not None:
+                full['id'] = item_kwargs['handle']
+            if item_kwargs.get('acls') is not None:
+                full['acl'] = item_kwargs['acls']
+            return self.encode_json(full, 'batchUpload')
+
+        def has_id(item):
+            if obj_type is None:
+                return 'id' in item
+            return isinstance(item, tuple) and item[1].get('handle') is not None
 
-    def find(self, query, token=None, ids=False, jsonFilter=None, full=False):
-        '''Find a Cordra object by query'''
+        def send(start, items, encoded):
+            data = b'[' + b','.join(encoded) + b']'
+
+            # Batches only updating or creating given ids can be resent
+            idempotent = all(has_id(item) for item in items)
+            try:
+                r = self.restpost('batchUpload', params=params, data=data,
+                                  headers={'Content-Type': 'application/json'},
+                                  idempotent=idempotent)
+            except Exception as e:
+                for i, item in enumerate(items):
+                    yield BulkResult(start + i, item, None, e)
+                return
+
+            results = {result['position']: result for result in r.get('results', [])}
+            for i, item in enumerate(items):
+                result = results.get(i)
+                if result is None:
+                    yield BulkResult(start + i, item, None,
+                                     RuntimeError('object not processed by batchUpload'))
+                elif result['responseCode'] >= 400:
+                    response = result.get('response')
+                    message = response.get('message', response) if isinstance(response, dict) else response
+                    yield BulkResult(start + i, item, None,
+                                     requests.HTTPError(f"{result['responseCode']}: {message}"))
+                else:
+                    response = result.get('response')
+                    if isinstance(response, dict) and 'id' in response:
+                        self.invalidate(response['id'])
+                    yield BulkResult(start + i, item, response, None)
+
+        start = 0
+        items = []
+        encoded = []
+        size = 0
+        for item in objs:
+            enc = encode(item)
+            if items and (len(items) >= max_count or size + len(enc) > max_bytes):
+                yield from send(start, items, encoded)
+                start += len(items)
+                items, encoded, size = [], [], 0
+            items.append(item)
+            encoded.append(enc)
+            size += len(enc) + 1
+        if items:
+            yield from send(start, items, encoded)
+
+    def find(self, query, token=None, ids=False, jsonFilter=None, full=False,
+             pageNum=None, pageSize=None, sortFields=None, raw=False):
+        '''
+        Find a Cordra object by query.  Give raw as for retrieve() to get
+        the undecoded search response.
+        '''
 
         params = dict()
         params['query'] = query
         params['full'] = full
 
         if jsonFilter:
-            params['filter'] = str(jsonFilter)
+            if not isinstance(jsonFilter, str):
+                jsonFilter = self.json_codec.dumps(list(jsonFilter)).decode('utf-8')
+            params['filter'] = jsonFilter
         
         if ids:
             params['ids'] = True 
         
-        r = self.restget('objects', params=params, headers=None)
+        if pageNum is not None:
+            params['pageNum'] = pageNum
+        if pageSize is not None:
+            params['pageSize'] = pageSize
+        if sortFields is not None:
+            params['sortFields'] = sortFields
+        
+        r = self.restget('objects', params=params, headers=None, raw=raw)
         return r
 
+    def find_iter(self, query, pageSize=100, prefetch=False, ids=False,
+                  jsonFilter=None, full=False, sortFields=None):
+        """
+        Find objects by query, lazily walking the result pages.
+
+        Parameters
+        ----------
+        query: str
+            The query.
+        pageSize: int, optional
+            The number of results fetched per request. Default value is 100.
+        prefetch: bool, optional
+            If True, the next page is fetched in the background while the
+            current one is being consumed.
+        ids: bool, optional
+            If True, only the ids of the matching objects are returned.
+        jsonFilter: list, optional
+            jsonPointers used to restrict the result objects.
+        full: bool, optional
+            If True, full Cordra objects are returned instead of content.
+        sortFields: str, optional
+            Sort specification, e.g. "metadata/createdOn DESC".  Giving a
+            sort keeps the paging stable while objects are modified.
+
+        Returns
+        -------
+        FindIterator
+            Iterates over the individual results.  Its size attribute gives
+            the total number of hits, known as soon as this returns.
+        """
+        return FindIterator(self, query, pageSize=pageSize, prefetch=prefetch,
+                            ids=ids, jsonFilter=jsonFilter, full=full,
+                            sortFields=sortFields)
+
     def check_credentials(self):
         self.restget('check-credentials')
 
+    def update(self, id, obj, old=None, obj_type=None, dryrun=False, full=False,
+               max_writes=8, max_ratio=0.5):
+        """
+        Update an object's content.  If the previously retrieved content is
+        given, only the parts that differ are sent, as jsonPointer writes
+        of the changed subtrees and jsonPointer deletes of removed keys.
+        The whole content is sent instead when there is no old content, the
+        diff needs more than max_writes requests, or the changed subtrees
+        are more than max_ratio of the size of the whole, counting each
+        request as 1 KB more for its headers and round trip.
+
+        Partial writes are separate requests, so a failure can leave some
+        of them applied, and they overwrite any concurrent changes to the
+        same subtrees.
+
+        Parameters
+        ----------
+        id: str
+            The id of the object.
+        obj: dict or object with a json() method
+            The new content.
+        old: dict, optional
+            The content the new content was derived from, e.g. as returned
+            by retrieve().
+        obj_type: str, optional
+            A new type for the object.  Changing the type sends the whole
+            content.
+        dryrun: bool, optional
+            Do not actually update the object.  Sends the whole content.
+        full: bool, optional
+            If True, the response is the full Cordra object, else only the
+            content.
+        max_writes: int, optional
+            The most requests sent for a diff. Default value is 8.
+        max_ratio: float, optional
+            The largest size of the changed subtrees and requests, as a
+            fraction of the size of the whole content, for which they are
+            sent alone.
+            Default value is 0.5.
+
+        Returns
+        -------
+        dict
+            The updated content, or full object if full.
+        """
+        rest_url = f'objects/{id}'
+
+        if not isinstance(obj, dict):
+            obj = self.json_codec.loads(obj.json())
+
+        params = {}
+        if obj_type is not None:
+            params['type'] = obj_type
+        if dryrun:
+            params['dryRun'] = dryrun
+        if full:
+            params['full'] = full
+
+        changes = None
+        if old is not None and obj_type is None and not dryrun:
+            changes = json_diff(old, obj)
+            if not changes:
+                return self.retrieve(id, full=True) if full else obj
+            if len(changes) > max_writes or any(c[1] == '' for c in changes):
+                changes = None
+
+        # Fall back to a full write when the diff is not much smaller
+        data = self.encode_json(obj, rest_url, 'put')
+        if changes is not None:
+            writes = [(c[1], self.encode_json(c[2], rest_url, 'put'))
+                      for c in changes if c[0] == 'put']
+            cost = sum(len(body) for _, body in writes) + 1024 * len(changes)
+            if cost > max_ratio * len(data):
+                changes = None
+        if changes is None:
+            return self.__write(id, lambda: self.restput(rest_url, params=params, data=data))
+
+        def send():
+            for change in changes:
+                if change[0] == 'delete':
+                    self.restdelete(rest_url, params={'jsonPointer': change[1]})
+            r = None
+            for i, (pointer, body) in enumerate(writes):
+                write_params = {'jsonPointer': pointer}
+                if full and i == len(writes) - 1:
+                    write_params['full'] = full
+                r = self.restput(rest_url, params=write_params, data=body)
+            return r
+
+        r = self.__write(id, send)
+        if r is None:
+            return self.retrieve(id, full=full)
+        return r
+
     def delete(self, obj_id, jsonPointer=None):
         '''Delete a Cordra object'''
 
@@ -170,4 +995,5 @@ class CordraClient(RestClient):
         if jsonPointer:
             params['jsonPointer'] = jsonPointer
 
-        return self.restdelete(f'objects/{obj_id}', params=params)
\ No newline at end of file
+        return self.__write(obj_id, lambda: self.restdelete(f'objects/{obj_id}',
+                                                            params=params))
\ No newline at end of file
@@ -0,0 +1,236 @@
+import sqlite3
+import time
+
+from .CordraClient import quote_term
+
+class CordraMirror():
+    """
+    Local SQLite replica of the Cordra objects matching a query, e.g. all
+    objects of one type.  sync() pulls only the objects modified since the
+    last sync and removes local objects deleted on the server, after which
+    reads are served from the local database.
+
+        with CordraMirror(client, 'documents.db', obj_type='Document') as mirror:
+            mirror.sync()
+            for obj in mirror.objects():
+                ...
+    """
+    def __init__(self, client, path, query=None, obj_type=None, pageSize=1000):
+        """
+        Class initialization.  Opens or creates the database.
+
+        Parameters
+        ----------
+        client : CordraClient
+            The client to sync through.
+        path : str or path-like
+            The SQLite database file.
+        query : str, optional
+            The query selecting the objects to mirror.
+        obj_type : str, optional
+            Mirror all objects of this type.  Alternative to query.
+        pageSize : int, optional
+            The number of objects fetched per request. Default value is
+            1000.
+
+        Raises
+        ------
+        ValueError
+            If neither or both of query and obj_type are given, or if the
+            database mirrors a different query.
+        """
+        if (query is None) == (obj_type is None):
+            raise ValueError('give exactly one of query and obj_type')
+        if obj_type is not None:
+            query = 'type:' + quote_term(obj_type)
+
+        self.__client = client
+        self.__query = query
+        self.__pageSize = pageSize
+        self.__codec = client.json_codec
+
+        self.__db = sqlite3.connect(str(path))
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS objects ('
+                          'id TEXT PRIMARY KEY, type TEXT, modified INTEGER, body BLOB)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)')
+        self.__db.commit()
+
+        stored = self.__state('query')
+        if stored is None:
+            self.__set_state('query', query)
+            self.__db.commit()
+        elif stored != query:
+            raise ValueError(f'{path} mirrors a different query: {stored}')
+
+    @property
+    def query(self):
+        """str: The query selecting the mirrored objects."""
+        return self.__query
+
+    @property
+    def watermark(self):
+        """int or None: The latest modifiedOn time synced, in ms."""
+        value = self.__state('watermark')
+        return int(value) if value is not None else None
+
+    def __state(self, key):
+        row = self.__db.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def __set_state(self, key, value):
+        self.__db.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                          (key, str(value)))
+
+    def sync(self, detect_deletes=True):
+        """
+        Updates the mirror.  The first sync pulls every matching object;
+        later ones pull only objects modified since the watermark.  Pages
+        are walked by modifiedOn and id rather than by page number, each
+        page starting after the last object of the previous one, so
+        objects changed during a sync are not skipped, none are fetched
+        twice and no deep pages are requested.
+
+        Parameters
+        ----------
+        detect_deletes : bool, optional
+            If True (default), the ids of all matching objects are fetched
+            and local objects missing from them are removed.  This also
+            drops objects that no longer match the query.
+
+        Returns
+        -------
+        dict
+            The numbers of objects fetched (including objects at the old
+            watermark, which are fetched again) and deleted, the number now
+            mirrored, the new watermark and the seconds taken.
+        """
+        start = time.perf_counter()
+        watermark = self.watermark
+        fetched = 0
+        pageNum = 0
+        after = None
+
+        while True:
+            query = self.__query
+            if after is not None:
+                modified, id = after
+                query = (f'({query}) AND (metadata/modifiedOn:{{{modified} TO *] OR '
+                         f'(metadata/modifiedOn:[{modified} TO {modified}] AND '
+                         f'id:{{{quote_term(id)} TO *]))')
+            elif watermark is not None:
+                query = f'({query}) AND metadata/modifiedOn:[{watermark} TO *]'
+            page = self.__client.find(query, full=True, pageNum=pageNum,
+                                      pageSize=self.__pageSize,
+                                      sortFields='metadata/modifiedOn,id')
+            results = page['results']
+
+            rows = []
+            for obj in results:
+                modified = obj.get('metadata', {}).get('modifiedOn')
+                rows.append((obj['id'], obj.get('type'), modified,
+                             self.__codec.dumps(obj)))
+            with self.__db:
+                self.__db.executemany('INSERT OR REPLACE INTO objects (id, type, modified, body) '
+                                      'VALUES (?, ?, ?, ?)', rows)
+                if results:
+                    last = results[-1].get('metadata', {}).get('modifiedOn')
+                    if last is not None and (watermark is None or last > watermark):
+                        self.__set_state('watermark', last)
+            fetched += len(results)
+
+            if len(results) < self.__pageSize:
+                break
+
+            # Continue after the last object, using its id to break ties
+            # between objects modified in the same millisecond
+            last = results[-1]
+            modified = last.get('metadata', {}).get('modifiedOn')
+            if modified is None:
+                pageNum += 1
+            else:
+                after = (modified, last['id'])
+                pageNum = 0
+
+        deleted = 0
+        if detect_deletes:
+            deleted = self.__delete_missing()
+
+        return {
+            'fetched': fetched,
+            'deleted': deleted,
+            'total': len(self),
+            'watermark': self.watermark,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def __delete_missing(self):
+        remote = set(self.__client.find_iter(self.__query, pageSize=max(self.__pageSize, 10000),
+                                             ids=True))
+        local = set(self.ids())
+        missing = [(id,) for id in local - remote]
+        with self.__db:
+            self.__db.executemany('DELETE FROM objects WHERE id = ?', missing)
+        return len(missing)
+
+    def resync(self):
+        """Discards the mirror and pulls every matching object again."""
+        with self.__db:
+            self.__db.execute('DELETE FROM objects')
+            self.__db.execute("DELETE FROM state WHERE key = 'watermark'")
+        return self.sync(detect_deletes=False)
+
+    def get(self, id, full=False, default=None):
+        """
+        Gets a mirrored object.
+
+        Parameters
+        ----------
+        id : str
+            The id of the object.
+        full : bool, optional
+            If True, the full Cordra object is returned, else only its
+            content.
+        default : any, optional
+            Returned if the object is not mirrored.
+        """
+        row = self.__db.execute('SELECT body FROM objects WHERE id = ?', (id,)).fetchone()
+        if row is None:
+            return default
+        obj = self.__codec.loads(row[0])
+        return obj if full else obj.get('content')
+
+    def objects(self, full=False):
+        """
+        Iterates over the mirrored objects in id order.
+
+        Parameters
+        ----------
+        full : bool, optional
+            If True, full Cordra objects are yielded, else only their
+            content.
+        """
+        for (body,) in self.__db.execute('SELECT body FROM objects ORDER BY id'):
+            obj = self.__codec.loads(body)
+            yield obj if full else obj.get('content')
+
+    def ids(self):
+        """Iterates over the ids of the mirrored objects."""
+        for (id,) in self.__db.execute('SELECT id FROM objects ORDER BY id'):
+            yield id
+
+    def __contains__(self, id):
+        return self.__db.execute('SELECT 1 FROM objects WHERE id = ?', (id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.__db.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+    def close(self):
+        """Closes the database."""
+        self.__db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+class FindIterator():
+    """
+    Lazily walks the pages of a CordraClient.find() query.  Only the
+    current page, and the next one if prefetching, is held in memory.
+    """
+    def __init__(self, client, query, pageSize=100, prefetch=False, **kwargs):
+        """
+        Class initialization.  Fetches the first page so that the total
+        number of hits is known up front.
+        
+        Parameters
+        ----------
+        client : CordraClient
+            The client to send the queries through.
+        query : str
+            The query.
+        pageSize : int, optional
+            The number of results fetched per request. Default value is
+            100.
+        prefetch : bool, optional
+            If True, the next page is fetched in a background thread while
+            the results of the current page are being consumed.
+        **kwargs : any, optional
+            Any other find() arguments, e.g. full, ids, jsonFilter or
+            sortFields.
+        """
+        if pageSize < 1:
+            raise ValueError('pageSize must be positive')
+        
+        self.__client = client
+        self.__query = query
+        self.__pageSize = pageSize
+        self.__prefetch = prefetch
+        self.__kwargs = kwargs
+        
+        self.__first = self.__fetch(0)
+        self.__size = self.__first.get('size', -1)
+    
+    @property
+    def size(self):
+        """int: The total number of hits reported for the query."""
+        return self.__size
+    
+    @property
+    def pageSize(self):
+        """int: The number of results fetched per request."""
+        return self.__pageSize
+    
+    def __fetch(self, pageNum):
+        return self.__client.find(self.__query, pageNum=pageNum,
+                                  pageSize=self.__pageSize, **self.__kwargs)
+    
+    def __iter__(self):
+        page = self.__first
+        if page is None:
+            raise RuntimeError('FindIterator can only be iterated over once')
+        self.__first = None
+        
+        with ThreadPoolExecutor(1) as executor:
+            pageNum = 0
+            while True:
+                results = page.get('results', [])
+                last = (len(results) < self.__pageSize or
+                        0 <= self.__size <= (pageNum + 1) * self.__pageSize)
+                
+                if not last and self.__prefetch:
+                    future = executor.submit(self.__fetch, pageNum + 1)
+                else:
+                    future = None
+                
+                page = None
+                yield from results
+                if last:
+                    break
+                
+                pageNum += 1
+                if future is not None:
+                    page = future.result()
+                else:
+                    page = self.__fetch(pageNum)
@@ -0,0 +1,121 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+class JSONCodec():
+    """
+    Encodes and decodes JSON bodies as bytes using the fastest available
+    backend: orjson, then ujson, then the standard library json module.
+    Note that orjson decodes integers beyond 64 bits as floats; use the
+    'json' backend if such values must round-trip exactly.
+    """
+    backends = ('orjson', 'ujson', 'json')
+
+    def __init__(self, backend=None):
+        """
+        Class initialization
+
+        Parameters
+        ----------
+        backend : str, optional
+            'orjson', 'ujson' or 'json'.  By default the first installed
+            one is used.
+
+        Raises
+        ------
+        ValueError
+            If backend is not a known backend.
+        ImportError
+            If backend is not installed.
+        """
+        if backend is None:
+            backend = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+        if backend not in self.backends:
+            raise ValueError(f'backend must be one of {self.backends}')
+        if backend == 'orjson' and orjson is None:
+            raise ImportError('orjson is not installed')
+        if backend == 'ujson' and ujson is None:
+            raise ImportError('ujson is not installed')
+        self.__backend = backend
+
+    @property
+    def backend(self):
+        """str: The name of the backend in use."""
+        return self.__backend
+
+    def dumps(self, obj):
+        """
+        Encodes an object as JSON.  Objects the backend cannot encode, such
+        as integers beyond 64 bits for orjson, are passed to the standard
+        library encoder.
+
+        Parameters
+        ----------
+        obj : any
+            The object to encode.
+
+        Returns
+        -------
+        bytes
+            The UTF-8 JSON.
+        """
+        if self.__backend == 'orjson':
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS |
+                                                orjson.OPT_SERIALIZE_NUMPY)
+            except TypeError:
+                pass
+        elif self.__backend == 'ujson':
+            try:
+                return ujson.dumps(obj, ensure_ascii=False,
+                                   escape_forward_slashes=False).encode('utf-8')
+            except (TypeError, OverflowError):
+                pass
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        """
+        Decodes JSON.
+
+        Parameters
+        ----------
+        data : bytes or str
+            The JSON.
+
+        Returns
+        -------
+        any
+            The decoded object.
+        """
+        if self.__backend == 'orjson':
+            return orjson.loads(data)
+        if self.__backend == 'ujson':
+            return ujson.loads(data)
+        return json.loads(data)
+
+    @staticmethod
+    def is_json(content_type):
+        """
+        Checks if a Content-Type header value is a JSON media type.
+
+        Parameters
+        ----------
+        content_type : str or None
+            The header value.
+
+        Returns
+        -------
+        bool
+        """
+        if not content_type:
+            return False
+        media_type = content_type.split(';', 1)[0].strip().lower()
+        return media_type == 'application/json' or media_type.endswith('+json')
@@ -0,0 +1,155 @@
+from collections.abc import Mapping
+import threading
+
+def escape_pointer(key):
+    """Escapes an object key for use as a jsonPointer segment."""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+class LazyObject(Mapping):
+    """
+    Read-only mapping view of a Cordra object's content that retrieves
+    top-level fields only when they are first accessed.  Fields are fetched
+    with filtered retrieve() calls and kept once fetched; accessing one
+    field also fetches any hinted fields not yet fetched, in the same
+    request.  Iterating, len() and to_dict() fetch the full content.
+    """
+    def __init__(self, client, id, hint=None):
+        """
+        Class initialization.  Nothing is fetched until a field is accessed.
+
+        Parameters
+        ----------
+        client : CordraClient
+            The client to retrieve the object through.
+        id : str
+            The id of the object.
+        hint : list of str, optional
+            Top-level fields likely to be accessed together.  They are
+            fetched in one request on the first access to any field.
+        """
+        self.__client = client
+        self.__id = id
+        self.__hint = list(hint) if hint is not None else []
+        self.__fields = {}
+        self.__missing = set()
+        self.__pointers = {}
+        self.__complete = False
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f'LazyObject({self.__id!r}, fetched={sorted(self.__fields)!r})'
+
+    @property
+    def id(self):
+        """str: The id of the object."""
+        return self.__id
+
+    @property
+    def fetched(self):
+        """tuple: The top-level fields fetched so far."""
+        return tuple(self.__fields)
+
+    @property
+    def complete(self):
+        """bool: True if the full content has been fetched."""
+        return self.__complete
+
+    def prefetch(self, *keys):
+        """
+        Fetches top-level fields in one request, skipping those already
+        fetched.
+
+        Parameters
+        ----------
+        *keys : str
+            The fields to fetch.
+        """
+        with self.__lock:
+            self.__fetch(keys)
+
+    def __fetch(self, keys):
+        keys = [k for k in dict.fromkeys(keys)
+                if k not in self.__fields and k not in self.__missing]
+        if self.__complete or not keys:
+            return
+        content = self.__client.retrieve(
+            self.__id, filter=['/' + escape_pointer(k) for k in keys])
+        for key in keys:
+            if key in content:
+                self.__fields[key] = content[key]
+            else:
+                self.__missing.add(key)
+
+    def __getitem__(self, key):
+        if key in self.__fields:
+            return self.__fields[key]
+        with self.__lock:
+            if not self.__complete:
+                self.__fetch([key] + self.__hint)
+        if key in self.__fields:
+            return self.__fields[key]
+        raise KeyError(key)
+
+    def load(self):
+        """Fetches the full content, if not already fetched."""
+        with self.__lock:
+            if self.__complete:
+                return
+            content = self.__client.retrieve(self.__id)
+            if not isinstance(content, dict):
+                raise TypeError(f'content of {self.__id} is not a JSON object')
+            self.__fields = content
+            self.__missing = set()
+            self.__complete = True
+
+    def __iter__(self):
+        self.load()
+        return iter(self.__fields)
+
+    def __len__(self):
+        self.load()
+        return len(self.__fields)
+
+    def to_dict(self):
+        """Returns the full content as a dict, fetching it if needed."""
+        self.load()
+        return dict(self.__fields)
+
+    def pointer(self, jsonPointer):
+        """
+        Gets the value at a jsonPointer into the content.  The value is
+        taken from an already fetched top-level field if possible, and is
+        otherwise retrieved alone using jsonPointer.
+
+        Parameters
+        ----------
+        jsonPointer : str
+            The jsonPointer, e.g. '/authors/0/name'.
+
+        Returns
+        -------
+        any
+        """
+        parts = [p.replace('~1', '/').replace('~0', '~')
+                 for p in jsonPointer.lstrip('/').split('/')] if jsonPointer.strip('/') else []
+        if not parts:
+            return self.to_dict()
+
+        if parts[0] in self.__fields:
+            value = self.__fields[parts[0]]
+            for part in parts[1:]:
+                value = value[int(part)] if isinstance(value, list) else value[part]
+            return value
+
+        if jsonPointer not in self.__pointers:
+            self.__pointers[jsonPointer] = self.__client.retrieve(
+                self.__id, jsonPointer=jsonPointer)
+        return self.__pointers[jsonPointer]
+
+    def refresh(self):
+        """Discards everything fetched so far."""
+        with self.__lock:
+            self.__fields = {}
+            self.__missing = set()
+            self.__pointers = {}
+            self.__complete = False
@@ -0,0 +1,241 @@
+import threading
+
+# Latency bucket upper bounds in seconds, growing by 1.5x from 0.5 ms to 1 min
+DEFAULT_BUCKETS = tuple(round(0.0005 * 1.5 ** i, 6) for i in range(30))
+
+class Histogram():
+    """
+    Fixed-bucket histogram with constant memory use.  Percentiles are
+    estimated by linear interpolation within a bucket.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Adds a value."""
+        i = 0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """
+        Estimates a percentile.
+
+        Parameters
+        ----------
+        q : float
+            The percentile, between 0 and 100.
+
+        Returns
+        -------
+        float or None
+            The estimate, or None if no values were added.
+        """
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n > 0 and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+class EndpointMetrics():
+    """
+    Metrics of the calls to one endpoint with one method.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.status = {}
+        self.latency = Histogram(buckets)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.encode_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def as_dict(self):
+        """Returns the metrics as a dict."""
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'status': dict(self.status),
+            'latency': {
+                'mean': self.latency.sum / self.latency.count if self.latency.count else None,
+                'p50': self.latency.percentile(50),
+                'p95': self.latency.percentile(95),
+                'p99': self.latency.percentile(99),
+                'max': self.latency.max if self.latency.count else None,
+            },
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'encode_seconds': self.encode_seconds,
+            'decode_seconds': self.decode_seconds,
+        }
+
+class MetricsCollector():
+    """
+    In-process, thread-safe collector of call metrics, kept per endpoint
+    and method: request counts, latency histograms, bytes sent and
+    received, status codes, retries and the time spent encoding and
+    decoding JSON.  Used as a RestClient hook, it receives the after()
+    event of every call attempt.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Class initialization
+
+        Parameters
+        ----------
+        buckets : tuple of float, optional
+            The latency histogram bucket upper bounds in seconds.  Defaults
+            to 30 buckets from 0.5 ms to about 1 min.
+        """
+        self.__buckets = tuple(buckets)
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def __get(self, endpoint, method):
+        key = (endpoint, method.upper())
+        metrics = self.__metrics.get(key)
+        if metrics is None:
+            metrics = self.__metrics[key] = EndpointMetrics(self.__buckets)
+        return metrics
+
+    def before(self, event):
+        """Hook called before each call attempt.  Nothing is recorded."""
+        pass
+
+    def after(self, event):
+        """
+        Hook called after each call attempt.
+
+        Parameters
+        ----------
+        event : dict
+            The call event, with endpoint, method, elapsed, status,
+            bytes_sent, bytes_received and error.
+        """
+        with self.__lock:
+            metrics = self.__get(event['endpoint'], event['method'])
+            metrics.requests += 1
+            metrics.latency.observe(event['elapsed'])
+            metrics.bytes_sent += event.get('bytes_sent') or 0
+            metrics.bytes_received += event.get('bytes_received') or 0
+            status = event.get('status')
+            if status is None or status >= 400 or event.get('error') is not None:
+                metrics.errors += 1
+            if status is not None:
+                metrics.status[status] = metrics.status.get(status, 0) + 1
+
+    def record_retry(self, endpoint, method):
+        """Counts a retry of a call."""
+        with self.__lock:
+            self.__get(endpoint, method).retries += 1
+
+    def record_encode(self, endpoint, method, seconds):
+        """Adds time spent encoding a JSON request body."""
+        with self.__lock:
+            self.__get(endpoint, method).encode_seconds += seconds
+
+    def record_decode(self, endpoint, method, seconds):
+        """Adds time spent decoding a JSON response body."""
+        with self.__lock:
+            self.__get(endpoint, method).decode_seconds += seconds
+
+    def reset(self):
+        """Clears all metrics."""
+        with self.__lock:
+            self.__metrics = {}
+
+    def as_dict(self):
+        """
+        Exports the metrics.
+
+        Returns
+        -------
+        dict
+            {endpoint: {method: metrics dict}}
+        """
+        out = {}
+        with self.__lock:
+            for (endpoint, method), metrics in sorted(self.__metrics.items()):
+                out.setdefault(endpoint, {})[method] = metrics.as_dict()
+        return out
+
+    def to_prometheus(self, prefix='cordra_client'):
+        """
+        Exports the metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            The prefix of the metric names. Default value is
+            'cordra_client'.
+
+        Returns
+        -------
+        str
+        """
+        series = {
+            'requests_total': ('counter', 'Call attempts by status code.'),
+            'errors_total': ('counter', 'Call attempts that failed or returned an error status.'),
+            'retries_total': ('counter', 'Retried calls.'),
+            'request_duration_seconds': ('histogram', 'Call attempt latency.'),
+            'sent_bytes_total': ('counter', 'Request body bytes sent.'),
+            'received_bytes_total': ('counter', 'Response body bytes received.'),
+            'json_encode_seconds_total': ('counter', 'Time spent encoding JSON bodies.'),
+            'json_decode_seconds_total': ('counter', 'Time spent decoding JSON bodies.'),
+        }
+        lines = {name: [] for name in series}
+
+        with self.__lock:
+            for (endpoint, method), m in sorted(self.__metrics.items()):
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                for status, n in sorted(m.status.items()):
+                    lines['requests_total'].append(
+                        f'{prefix}_requests_total{{{labels},status="{status}"}} {n}')
+                lines['errors_total'].append(f'{prefix}_errors_total{{{labels}}} {m.errors}')
+                lines['retries_total'].append(f'{prefix}_retries_total{{{labels}}} {m.retries}')
+
+                cumulative = 0
+                hist = lines['request_duration_seconds']
+                for bound, n in zip(m.latency.buckets, m.latency.counts):
+                    cumulative += n
+                    hist.append(f'{prefix}_request_duration_seconds_bucket'
+                                f'{{{labels},le="{bound}"}} {cumulative}')
+                hist.append(f'{prefix}_request_duration_seconds_bucket'
+                            f'{{{labels},le="+Inf"}} {m.latency.count}')
+                hist.append(f'{prefix}_request_duration_seconds_sum{{{labels}}} {m.latency.sum}')
+                hist.append(f'{prefix}_request_duration_seconds_count{{{labels}}} {m.latency.count}')
+
+                lines['sent_bytes_total'].append(f'{prefix}_sent_bytes_total{{{labels}}} {m.bytes_sent}')
+                lines['received_bytes_total'].append(
+                    f'{prefix}_received_bytes_total{{{labels}}} {m.bytes_received}')
+                lines['json_encode_seconds_total'].append(
+                    f'{prefix}_json_encode_seconds_total{{{labels}}} {m.encode_seconds}')
+                lines['json_decode_seconds_total'].append(
+                    f'{prefix}_json_decode_seconds_total{{{labels}}} {m.decode_seconds}')
+
+        out = []
+        for name, (kind, help) in series.items():
+            out.append(f'# HELP {prefix}_{name} {help}')
+            out.append(f'# TYPE {prefix}_{name} {kind}')
+            out.extend(lines[name])
+        return '\n'.join(out) + '\n'
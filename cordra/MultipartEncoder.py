@@ -0,0 +1,174 @@
+import mimetypes
+import os
+import uuid
+
+class MultipartEncoder():
+    """
+    Streaming multipart/form-data request body.  Files are read in chunks
+    of a fixed size only as the body is sent, so memory use does not
+    depend on the payload sizes.  The Content-Length is computed up front
+    from the file sizes.
+    
+    Pass as the data of a requests call together with the content_type
+    header:
+    
+        r = session.post(url, data=encoder,
+                         headers={'Content-Type': encoder.content_type})
+    """
+    def __init__(self, fields=None, files=None, chunk_size=2**16,
+                 callback=None, boundary=None):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        fields : dict, optional
+            Plain form fields as name: str value.
+        files : dict, optional
+            File fields as name: (filename, path) or name: (filename, path,
+            content_type).  filename is the name reported to the server
+            and path is where the file is read from.
+        chunk_size : int, optional
+            The number of bytes read from a file at a time.  Default value
+            is 64 KiB.
+        callback : callable, optional
+            Called as callback(bytes_read, total) each time a chunk of the
+            body has been read, e.g. for progress reporting.
+        boundary : str, optional
+            The multipart boundary.  A random one is used if not given.
+        """
+        if fields is None:
+            fields = {}
+        if files is None:
+            files = {}
+        if boundary is None:
+            boundary = uuid.uuid4().hex
+        
+        self.__boundary = boundary
+        self.__chunk_size = chunk_size
+        self.__callback = callback
+        
+        # Build the list of parts as (header, value, path)
+        self.__parts = []
+        for name, value in fields.items():
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+            header = (f'--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{self.__quote(name)}"\r\n\r\n')
+            self.__parts.append((header.encode('utf-8'), value, None))
+        for name, spec in files.items():
+            filename, path = spec[:2]
+            if len(spec) > 2:
+                content_type = spec[2]
+            else:
+                content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            header = (f'--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{self.__quote(name)}"; '
+                      f'filename="{self.__quote(filename)}"\r\n'
+                      f'Content-Type: {content_type}\r\n\r\n')
+            self.__parts.append((header.encode('utf-8'), None, os.fspath(path)))
+        self.__end = f'--{boundary}--\r\n'.encode('utf-8')
+        
+        self.__len = len(self.__end)
+        for header, value, path in self.__parts:
+            self.__len += len(header) + 2
+            if path is None:
+                self.__len += len(value)
+            else:
+                self.__len += os.path.getsize(path)
+        
+        self.__handle = None
+        self.__bytes_read = 0
+        self.__buffer = b''
+        self.__chunks = self.__iter_chunks()
+    
+    @staticmethod
+    def __quote(name):
+        return name.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+    
+    def __len__(self):
+        return self.__len
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    @property
+    def content_type(self):
+        """str: The Content-Type header value, including the boundary."""
+        return f'multipart/form-data; boundary={self.__boundary}'
+    
+    @property
+    def bytes_read(self):
+        """int: The number of body bytes read so far."""
+        return self.__bytes_read
+    
+    def __iter_chunks(self):
+        for header, value, path in self.__parts:
+            yield header
+            if path is None:
+                yield value
+            else:
+                # Only one file is open at a time, and only while being read
+                self.__handle = open(path, 'rb')
+                try:
+                    while True:
+                        chunk = self.__handle.read(self.__chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+                finally:
+                    self.close()
+            yield b'\r\n'
+        yield self.__end
+    
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.__chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    
+    def read(self, size=-1):
+        """
+        Reads the next bytes of the body.
+        
+        Parameters
+        ----------
+        size : int, optional
+            The maximum number of bytes to return.  If negative (default),
+            the whole remaining body is returned.
+        
+        Returns
+        -------
+        bytes
+            The data, or b'' once the body is exhausted.
+        """
+        buffer = self.__buffer
+        while size < 0 or len(buffer) < size:
+            chunk = next(self.__chunks, None)
+            if chunk is None:
+                break
+            buffer += chunk
+        
+        if size < 0:
+            data, self.__buffer = buffer, b''
+        else:
+            data, self.__buffer = buffer[:size], buffer[size:]
+        
+        if data:
+            self.__bytes_read += len(data)
+            if self.__callback is not None:
+                self.__callback(self.__bytes_read, self.__len)
+        
+        return data
+    
+    def close(self):
+        """
+        Closes the file currently being read, if any.
+        """
+        if self.__handle is not None:
+            self.__handle.close()
+            self.__handle = None
@@ -0,0 +1,180 @@
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'last_modified', 'expires',
+                                       'content_type'])
+
+class ObjectCache():
+    """
+    Thread-safe LRU cache of retrieved object bodies with TTL expiry and a
+    memory bound.  Entries past their TTL are kept so that they can be
+    revalidated with a conditional GET rather than fetched again.
+    """
+    def __init__(self, max_entries=1024, max_bytes=64*2**20, ttl=60.0):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        max_entries : int, optional
+            The maximum number of cached responses. Default value is 1024.
+        max_bytes : int, optional
+            The maximum total size of the cached response bodies. Default
+            value is 64 MiB.
+        ttl : float, optional
+            Seconds during which an entry is served without contacting the
+            server.  Afterwards it is revalidated, conditionally if the
+            server sent an ETag or Last-Modified header.  Default value is
+            60.
+        """
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__ttl = ttl
+        
+        self.__entries = OrderedDict()
+        self.__keys_by_id = {}
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        
+        self.__hits = 0
+        self.__misses = 0
+        self.__revalidations = 0
+        self.__evictions = 0
+    
+    @property
+    def ttl(self):
+        """float: Seconds during which an entry is served as is."""
+        return self.__ttl
+    
+    @property
+    def stats(self):
+        """dict: Counts of hits, misses, revalidations and evictions."""
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'revalidations': self.__revalidations,
+                'evictions': self.__evictions,
+                'entries': len(self.__entries),
+                'bytes': self.__bytes,
+            }
+    
+    def get(self, key):
+        """
+        Looks up an entry and counts a hit if it is still fresh.
+        
+        Parameters
+        ----------
+        key : tuple
+            The cache key, starting with the object id.
+        
+        Returns
+        -------
+        entry : CacheEntry or None
+            The entry, fresh or stale, or None if not cached.
+        fresh : bool
+            True if the entry can be used without contacting the server.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None, False
+            
+            self.__entries.move_to_end(key)
+            if time.monotonic() < entry.expires:
+                self.__hits += 1
+                return entry, True
+            
+            return entry, False
+    
+    def put(self, key, body, etag=None, last_modified=None, content_type=None):
+        """
+        Adds or replaces an entry, evicting least recently used entries to
+        stay within the bounds.
+        
+        Parameters
+        ----------
+        key : tuple
+            The cache key, starting with the object id.
+        body : bytes
+            The response body.
+        etag : str, optional
+            The ETag header of the response.
+        last_modified : str, optional
+            The Last-Modified header of the response.
+        content_type : str, optional
+            The Content-Type header of the response.
+        """
+        if len(body) > self.__max_bytes:
+            return
+        entry = CacheEntry(body, etag, last_modified, time.monotonic() + self.__ttl,
+                           content_type)
+        
+        with self.__lock:
+            self.__remove(key)
+            self.__entries[key] = entry
+            self.__keys_by_id.setdefault(key[0], set()).add(key)
+            self.__bytes += len(body)
+            
+            while (len(self.__entries) > self.__max_entries or
+                   self.__bytes > self.__max_bytes):
+                self.__remove(next(iter(self.__entries)))
+                self.__evictions += 1
+    
+    def revalidated(self, key):
+        """
+        Marks an entry as confirmed unchanged by the server, restarting its
+        TTL.
+        
+        Parameters
+        ----------
+        key : tuple
+            The cache key, starting with the object id.
+        
+        Returns
+        -------
+        CacheEntry or None
+            The renewed entry, or None if it has been evicted meanwhile.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            entry = entry._replace(expires=time.monotonic() + self.__ttl)
+            self.__entries[key] = entry
+            self.__revalidations += 1
+            return entry
+    
+    def invalidate(self, id):
+        """
+        Removes all entries for an object.
+        
+        Parameters
+        ----------
+        id : str
+            The object id.
+        """
+        with self.__lock:
+            for key in list(self.__keys_by_id.get(id, ())):
+                self.__remove(key)
+    
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__keys_by_id.clear()
+            self.__bytes = 0
+    
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+        self.__bytes -= len(entry.body)
+        keys = self.__keys_by_id[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.__keys_by_id[key[0]]
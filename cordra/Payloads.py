@@ -1,6 +1,7 @@
 from pathlib import Path
 
-from . import aslist
+from .aslist import aslist
+from .MultipartEncoder import MultipartEncoder
 
 class Payloads():
     def __init__(self, names=None, filenames=None):
@@ -23,6 +24,7 @@ class Payloads():
         """
         self.__names = []
         self.__filenames = []
+        self.__handles = []
         
         if names is not None or filenames is not None:
             assert names is not None and filenames is not None
@@ -76,10 +78,62 @@ class Payloads():
     
     def json(self):
         """
-        Generates the JSON content for the payloads
+        Generates the files content for the payloads as accepted by
+        requests.  The opened file handles are closed by close().
         """
         out = {}
         for name, filename in zip(self.__names, self.__filenames):
-            out[name] = (Path(filename).name, open(filename,'rb'))
+            handle = open(filename,'rb')
+            self.__handles.append(handle)
+            out[name] = (Path(filename).name, handle)
         
-        return out
\ No newline at end of file
+        return out
+    
+    def encoder(self, content=None, acl=None, chunk_size=2**16, callback=None):
+        """
+        Generates a streaming multipart body for the payloads.  The files
+        are read in chunks while the body is sent rather than being loaded
+        into memory.
+        
+        Parameters
+        ----------
+        content : str, optional
+            The JSON content of the object to send with the payloads.
+        acl : str, optional
+            The JSON acl of the object to send with the payloads.
+        chunk_size : int, optional
+            The number of bytes read from a file at a time.  Default value
+            is 64 KiB.
+        callback : callable, optional
+            Called as callback(bytes_read, total) as the body is sent, e.g.
+            for progress reporting.
+        
+        Returns
+        -------
+        MultipartEncoder
+        """
+        fields = {}
+        if content is not None:
+            fields['content'] = content
+        if acl is not None:
+            fields['acl'] = acl
+        files = {}
+        for name, filename in zip(self.__names, self.__filenames):
+            files[name] = (Path(filename).name, filename)
+        
+        return MultipartEncoder(fields=fields, files=files,
+                                chunk_size=chunk_size, callback=callback)
+    
+    def close(self):
+        """
+        Closes any file handles opened by json().
+        """
+        for handle in self.__handles:
+            handle.close()
+        self.__handles = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
\ No newline at end of file
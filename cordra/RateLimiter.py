@@ -0,0 +1,94 @@
+import threading
+import time
+
+class RateLimiter():
+    """
+    Thread-safe token bucket limiting the rate of calls.  Tokens refill at
+    a steady rate up to a burst capacity; a call takes one token, waiting
+    for it if the bucket is empty.  Waiting callers are served in order.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        rate : float
+            The sustained number of calls per second.
+        burst : float, optional
+            The number of calls that can be made at once after a quiet
+            period.  Defaults to rate, with a minimum of 1.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if burst is None:
+            burst = max(1.0, rate)
+        
+        self.__rate = float(rate)
+        self.__burst = float(burst)
+        self.__tokens = float(burst)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+    
+    @property
+    def rate(self):
+        """float: The sustained number of calls per second."""
+        return self.__rate
+    
+    @property
+    def burst(self):
+        """float: The bucket capacity."""
+        return self.__burst
+    
+    def reserve(self, tokens=1):
+        """
+        Takes tokens from the bucket, going into debt if needed.
+        
+        Parameters
+        ----------
+        tokens : float, optional
+            The number of tokens to take. Default value is 1.
+        
+        Returns
+        -------
+        float
+            The number of seconds to wait before the call may be made.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__burst,
+                                self.__tokens + (now - self.__last) * self.__rate)
+            self.__last = now
+            self.__tokens -= tokens
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.__rate
+    
+    def acquire(self, tokens=1):
+        """
+        Blocks until a call may be made.
+        
+        Parameters
+        ----------
+        tokens : float, optional
+            The number of tokens to take. Default value is 1.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self, tokens=1):
+        """
+        Waits without blocking the event loop until a call may be made.
+        
+        Parameters
+        ----------
+        tokens : float, optional
+            The number of tokens to take. Default value is 1.
+        """
+        # Deferred so that threaded users do not pay for importing asyncio
+        import asyncio
+
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -3,9 +3,20 @@
 # Standard library imports
 import getpass
 from pathlib import Path
+import threading
+import time
 
 # http://docs.python-requests.org
 import requests
+from requests.adapters import HTTPAdapter
+
+from . import compression
+from .ConcurrencyLimiter import ConcurrencyLimiter
+from .JSONCodec import JSONCodec
+from .MetricsCollector import MetricsCollector
+from .RateLimiter import RateLimiter
+from .RetryPolicy import RetryPolicy
+from .SingleFlight import SingleFlight, freeze, scope
 
 # Ignore certification warnings (for now)
 from requests.packages.urllib3.exceptions import InsecureRequestWarning # pylint: disable=import-error
@@ -15,8 +26,15 @@ class RestClient(object):
     """
     Generic class for building REST calls to web databases in Python.
     """
+    # Values of the raw argument of restrequest()
+    raw_modes = (False, True, 'bytes', 'memoryview', 'stream')
+
     def __init__(self, host, username=None, password=None, 
-                auth=None, cert=None, verify=True):
+                auth=None, cert=None, verify=True, pool_connections=10,
+                pool_maxsize=10, pool_block=False, keep_alive=True,
+                retry=None, rate_limiter=None, concurrency_limiter=None,
+                metrics=None, hooks=None, json_codec=None, coalesce=False,
+                compress=None, compress_min_size=1024, accept_encoding=True):
         """
         Class initializer. Tests and stores access information.
         
@@ -35,7 +53,91 @@ class RestClient(object):
                 it controls whether we verify the server’s TLS certificate,
                 or a string, in which case it must be a path to a CA
                 bundle to use. Defaults to True.
+            pool_connections: (int, optional) The number of distinct hosts
+                to keep connection pools for. Defaults to 10.
+            pool_maxsize: (int, optional) The maximum number of connections
+                kept open to a single host. Should be at least the number
+                of threads sharing the client. Defaults to 10.
+            pool_block: (bool, optional) If True, requests wait for a free
+                connection when pool_maxsize connections are in use instead
+                of opening extra, unpooled connections. Defaults to False.
+            keep_alive: (bool, optional) If True (default), connections are
+                kept open and reused between calls. If False, every call
+                asks the server to close the connection afterwards.
+            retry: (RetryPolicy or int, optional) The policy for retrying
+                failed calls, or the number of retries to make with the
+                default RetryPolicy settings. Default is no retries.
+            rate_limiter: (RateLimiter or float, optional) Limits the rate
+                of calls, or the number of calls per second for a default
+                RateLimiter. Default is no limit.
+            concurrency_limiter: (ConcurrencyLimiter or bool, optional)
+                Adaptively limits the number of calls in flight across all
+                threads using the client. If True, a default
+                ConcurrencyLimiter is used. Default is no limit.
+            metrics: (MetricsCollector or bool, optional) Collects per
+                endpoint metrics of all calls. If True, a new
+                MetricsCollector is used. Default is no metrics.
+            hooks: (list, optional) Objects with before(event) and/or
+                after(event) methods called around every call attempt.
+                See add_hook().
+            json_codec: (JSONCodec or str, optional) The codec used for
+                JSON bodies, or the name of its backend.  Default uses
+                orjson or ujson if installed, else the json module.
+            coalesce: (SingleFlight or bool, optional) If True, concurrent
+                identical GET and HEAD calls share one request and its
+                decoded result, which callers should not modify.  A
+                SingleFlight can be given to share calls between clients;
+                only calls to the same host with the same auth are
+                shared. Default is False.
+            compress: (str, optional) 'gzip', 'deflate' or 'zstd' to
+                compress POST, PUT and PATCH bodies of at least
+                compress_min_size bytes, sent with a Content-Encoding
+                header.  The server must accept compressed requests, which
+                Cordra's Jetty does only if configured to.  Streamed
+                bodies are not compressed.  Default is no compression.
+            compress_min_size: (int, optional) The smallest body size in
+                bytes to compress. Defaults to 1024.
+            accept_encoding: (str or bool, optional) The Accept-Encoding
+                header sent with every call.  If True, every encoding the
+                installed urllib3 decodes is listed, e.g. gzip, deflate
+                and br or zstd when their packages are installed.  If
+                False, 'identity' asks for uncompressed responses.
+                Compressed responses are decoded as they are read, also
+                when streamed.  Defaults to True.
         """
+        # Set JSON codec
+        self.json_codec = json_codec
+
+        # Set in-flight call sharing
+        self.coalesce = coalesce
+
+        # Set request compression
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+
+        # Set instrumentation
+        self.metrics = metrics
+        self.__hooks = []
+        for hook in hooks if hooks is not None else []:
+            self.add_hook(hook)
+
+        # Set limits
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+
+        # Set retry policy
+        self.retry = retry
+        self.__retries = 0
+        self.__retries_lock = threading.Lock()
+
+        # Build the persistent session
+        self.__pool_maxsize = pool_maxsize
+        self.__session = self.build_session(pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize,
+                                            pool_block=pool_block,
+                                            keep_alive=keep_alive)
+        self.accept_encoding = accept_encoding
+
         # Set access information
         self.login(host, username=username, password=password,
                    auth=auth, cert=cert, verify=verify)
@@ -43,6 +145,12 @@ class RestClient(object):
     def __str__(self):
         """String representation."""
         return f'RestClient for {self.username} @ {self.host}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
         
     @property
     def host(self):
@@ -64,6 +172,257 @@ class RestClient(object):
         """bool: The verify setting for the database."""
         return self.__verify
 
+    @property
+    def auth(self):
+        """tuple, requests.auth.AuthBase or None: The auth sent with calls."""
+        return self.__auth
+
+    @auth.setter
+    def auth(self, value):
+        self.__auth = value
+
+    @property
+    def retry(self):
+        """RetryPolicy or None: The policy for retrying failed calls."""
+        return self.__retry
+
+    @retry.setter
+    def retry(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            value = RetryPolicy(total=value)
+        self.__retry = value
+
+    @property
+    def rate_limiter(self):
+        """RateLimiter or None: The limit on the rate of calls."""
+        return self.__rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = RateLimiter(value)
+        self.__rate_limiter = value
+
+    @property
+    def concurrency_limiter(self):
+        """ConcurrencyLimiter or None: The limit on calls in flight."""
+        return self.__concurrency_limiter
+
+    @concurrency_limiter.setter
+    def concurrency_limiter(self, value):
+        if value is True:
+            value = ConcurrencyLimiter()
+        elif value is False:
+            value = None
+        self.__concurrency_limiter = value
+
+    @property
+    def json_codec(self):
+        """JSONCodec: The codec used for JSON bodies."""
+        return self.__json_codec
+
+    @json_codec.setter
+    def json_codec(self, value):
+        if not isinstance(value, JSONCodec):
+            value = JSONCodec(value)
+        self.__json_codec = value
+
+    @property
+    def coalesce(self):
+        """SingleFlight or None: Shares concurrent identical reads."""
+        return self.__coalesce
+
+    @coalesce.setter
+    def coalesce(self, value):
+        if value is True:
+            value = SingleFlight()
+        elif value is False:
+            value = None
+        self.__coalesce = value
+
+    @property
+    def compress(self):
+        """str or None: The encoding large request bodies are compressed with."""
+        return self.__compress
+
+    @compress.setter
+    def compress(self, value):
+        if value is not None:
+            compression.check_encoding(value)
+        self.__compress = value
+
+    @property
+    def accept_encoding(self):
+        """str: The Accept-Encoding header sent with every call."""
+        return self.__session.headers['Accept-Encoding']
+
+    @accept_encoding.setter
+    def accept_encoding(self, value):
+        if value is True:
+            value = compression.accept_encoding()
+        elif value is False:
+            value = 'identity'
+        self.__session.headers['Accept-Encoding'] = value
+
+    @property
+    def metrics(self):
+        """MetricsCollector or None: The collector of call metrics."""
+        return self.__metrics
+
+    @metrics.setter
+    def metrics(self, value):
+        if value is True:
+            value = MetricsCollector()
+        elif value is False:
+            value = None
+        self.__metrics = value
+
+    @property
+    def hooks(self):
+        """tuple: The hooks called around every call attempt."""
+        return tuple(self.__hooks)
+
+    def add_hook(self, hook):
+        """
+        Adds a hook called around every call attempt, including retries.
+        
+        Args:
+            hook: (any) An object with a before(event) and/or after(event)
+                method.  event is a dict with the method, endpoint, url
+                and attempt number.  Before after() is called, elapsed
+                (seconds), status (None if no response), bytes_sent,
+                bytes_received and error (None or the exception) are
+                added.  The same dict is passed to both methods, so state
+                can be carried between them.
+        """
+        self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """
+        Removes a hook added with add_hook().
+        
+        Args:
+            hook: (any) The hook to remove.
+        """
+        self.__hooks.remove(hook)
+
+    def endpoint(self, rest_url):
+        """
+        Gives the name that calls to a REST URL are grouped under in
+        metrics.
+        
+        Args:
+            rest_url: (str) The REST command URL, i.e. URL path after host.
+        
+        Returns:
+            str: The first segment of the path.
+        """
+        return rest_url.strip('/').split('/', 1)[0]
+
+    def encode_json(self, obj, rest_url, method='post'):
+        """
+        Encodes a request body as JSON, recording the time taken in the
+        metrics.
+        
+        Args:
+            obj: (any) The object to encode.
+            rest_url: (str) The REST command URL the body is sent to.
+            method: (str, optional) The method the body is sent with.
+        
+        Returns:
+            bytes: The UTF-8 JSON.
+        """
+        if self.__metrics is None:
+            return self.__json_codec.dumps(obj)
+        start = time.perf_counter()
+        data = self.__json_codec.dumps(obj)
+        self.__metrics.record_encode(self.endpoint(rest_url), method,
+                                     time.perf_counter() - start)
+        return data
+
+    def decode_body(self, body, content_type, rest_url, method='get'):
+        """
+        Decodes a response body according to its Content-Type, recording
+        the time taken in the metrics.
+        
+        Args:
+            body: (bytes) The response body.
+            content_type: (str or None) The Content-Type header.  Bodies
+                without one are decoded as JSON if they parse as JSON.
+            rest_url: (str) The REST command URL the body came from.
+            method: (str, optional) The method of the call.
+        
+        Returns:
+            any or str: The decoded JSON or, if not JSON, the text.
+        """
+        start = time.perf_counter()
+        try:
+            if not body:
+                return ''
+            if self.__json_codec.is_json(content_type):
+                return self.__json_codec.loads(body)
+            if content_type is None:
+                try:
+                    return self.__json_codec.loads(body)
+                except ValueError:
+                    pass
+            return body.decode('utf-8', errors='replace')
+        finally:
+            if self.__metrics is not None:
+                self.__metrics.record_decode(self.endpoint(rest_url), method,
+                                             time.perf_counter() - start)
+
+    @property
+    def retries(self):
+        """int: The number of retries made so far."""
+        return self.__retries
+
+    @property
+    def session(self):
+        """requests.Session: The persistent session used for all calls."""
+        return self.__session
+
+    @property
+    def pool_maxsize(self):
+        """int: The maximum number of pooled connections to the host."""
+        return self.__pool_maxsize
+
+    def build_session(self, pool_connections=10, pool_maxsize=10,
+                      pool_block=False, keep_alive=True):
+        """
+        Builds the requests.Session that all calls are sent through.
+        
+        Args:
+            pool_connections: (int, optional) The number of distinct hosts
+                to keep connection pools for. Defaults to 10.
+            pool_maxsize: (int, optional) The maximum number of connections
+                kept open to a single host. Defaults to 10.
+            pool_block: (bool, optional) If True, requests wait for a free
+                pooled connection instead of opening extra ones. Defaults
+                to False.
+            keep_alive: (bool, optional) If False, a "Connection: close"
+                header is sent with every call. Defaults to True.
+        
+        Returns:
+            requests.Session
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        
+        return session
+
+    def close(self):
+        """
+        Closes the session and any pooled connections.
+        """
+        self.__session.close()
+
     def login(self, host, username=None, password=None, auth=None, cert=None,
               verify=True):
         """
@@ -143,10 +502,12 @@ class RestClient(object):
         # Default behavior is no test: must be set specific to database type
         pass
 
-    def restrequest(self, method, rest_url, **kwargs):
+    def restresponse(self, method, rest_url, **kwargs):
         """
-        Wrapper around requests.request that automatically sets any access
-        parameters based on the stored login information.
+        Wrapper around requests.Session.request that automatically sets any
+        access parameters based on the stored login information.  All calls
+        share the client's pooled connections.  Unlike restrequest(), the
+        response body is not decoded.
         
         Args:
             method: (str) Method for the new Request object.
@@ -154,6 +515,14 @@ class RestClient(object):
             **kwargs: (any, optional) Any other arguments supported by
                 requests.request() except for url.  auth, verify, and/or
                 cert will default to values set during class initialization.
+                Give stream=True to read the body lazily with
+                Response.iter_content().  Give idempotent=True or False to
+                override whether the retry policy treats the call as safe
+                to send again.  Give limit=False to send the call outside
+                the rate and concurrency limits, as auth calls made while
+                another call holds a slot must be.  Give quiet as True, or
+                as the status codes expected, to raise those errors
+                without printing the response body.
         
         Returns:
             requests.Response
@@ -168,23 +537,213 @@ class RestClient(object):
         auth = kwargs.pop('auth', self.__auth)
         cert = kwargs.pop('cert', self.cert)
         verify = kwargs.pop('verify', self.verify)
+        idempotent = kwargs.pop('idempotent', None)
+        limit = kwargs.pop('limit', True)
+        quiet = kwargs.pop('quiet', False)
         
-        # Send request
-        response = requests.request(method, url, auth=auth, verify=verify,
-                                    cert=cert, **kwargs)
+        # Compress large bodies once, before any retries
+        if self.__compress is not None and method.lower() in ('post', 'put', 'patch'):
+            kwargs = self.__compress_body(kwargs)
+        
+        # Streamed bodies and files cannot be sent again
+        policy = self.retry
+        data = kwargs.get('data')
+        if policy is not None and ('files' in kwargs or not
+                                   isinstance(data, (type(None), str, bytes, dict, list, tuple))):
+            policy = None
+        
+        event = {'method': method.upper(), 'endpoint': self.endpoint(rest_url),
+                 'url': url}
+        attempt = 0
+        while True:
+            # Send request
+            event['attempt'] = attempt
+            try:
+                response = self.__send(method, url, event, limit, auth=auth, verify=verify,
+                                       cert=cert, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # Only retry calls that may have reached the server if safe
+                if (policy is None or attempt >= policy.total or not
+                    (isinstance(e, requests.ConnectTimeout) or
+                     policy.is_idempotent(method, idempotent))):
+                    raise
+                wait = policy.backoff(attempt)
+            else:
+                if (policy is None or attempt >= policy.total or
+                    response.status_code not in policy.status_forcelist or not
+                    policy.is_idempotent(method, idempotent)):
+                    break
+                wait = policy.backoff(attempt, response)
+                response.close()
+            
+            with self.__retries_lock:
+                self.__retries += 1
+            if self.__metrics is not None:
+                self.__metrics.record_retry(event['endpoint'], method)
+            attempt += 1
+            time.sleep(wait)
         
         # Check for errors
         if not response.ok:
-            try:
-                print(response.json())
-            except BaseException:
-                print(response.text)
+            if quiet is not True and response.status_code not in (quiet or ()):
+                try:
+                    print(response.json())
+                except BaseException:
+                    print(response.text)
+            response.close()
             response.raise_for_status()
-        else:
-            try:
-                return response.json()
-            except BaseException:
-                return response.text
+        
+        return response
+
+    def __compress_body(self, kwargs):
+        """Returns kwargs with a large bytes or str body compressed."""
+        data = kwargs.get('data')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if (not isinstance(data, (bytes, bytearray, memoryview)) or 'files' in kwargs
+                or len(data) < self.compress_min_size):
+            return kwargs
+        headers = dict(kwargs.get('headers') or {})
+        if any(k.lower() == 'content-encoding' for k in headers):
+            return kwargs
+        
+        compressed = compression.compress(data, self.__compress)
+        if len(compressed) >= len(data):
+            return kwargs
+        headers['Content-Encoding'] = self.__compress
+        return dict(kwargs, data=compressed, headers=headers)
+
+    def __send(self, method, url, event, limit, **kwargs):
+        """
+        Sends one call attempt within the rate and concurrency limits, if
+        limit, calling the hooks around it.
+        """
+        hooks = self.__hooks
+        if self.__metrics is not None:
+            hooks = hooks + [self.__metrics]
+        
+        # Wait for the rate and concurrency limits
+        if limit and self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        limiter = self.concurrency_limiter if limit else None
+        if limiter is not None:
+            limit_start = limiter.acquire()
+        
+        for hook in hooks:
+            if hasattr(hook, 'before'):
+                hook.before(event)
+        
+        start = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            return response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            event['elapsed'] = time.perf_counter() - start
+            if limiter is not None:
+                if response is None:
+                    limiter.release(limit_start, error=True)
+                else:
+                    limiter.release(limit_start, status=response.status_code)
+            
+            if hooks:
+                event['error'] = error
+                event['status'] = None
+                event['bytes_sent'] = 0
+                event['bytes_received'] = 0
+                if response is not None:
+                    event['status'] = response.status_code
+                    event['bytes_sent'] = int(response.request.headers.get('Content-Length', 0))
+                    received = response.headers.get('Content-Length')
+                    if received is not None:
+                        event['bytes_received'] = int(received)
+                    elif not kwargs.get('stream', False):
+                        event['bytes_received'] = len(response.content)
+                for hook in hooks:
+                    if hasattr(hook, 'after'):
+                        hook.after(event)
+
+    def restrequest(self, method, rest_url, **kwargs):
+        """
+        Wrapper around requests.Session.request that automatically sets any
+        access parameters based on the stored login information.  All calls
+        share the client's pooled connections.
+        
+        Args:
+            method: (str) Method for the new Request object.
+            rest_url: (str) The REST command URL, i.e. URL path after host.
+            **kwargs: (any, optional) Any other arguments supported by
+                requests.request() except for url.  auth, verify, and/or
+                cert will default to values set during class initialization.
+                Give raw to skip decoding the body: True or 'bytes'
+                returns the body bytes, 'memoryview' returns a memoryview
+                of a buffer the body is read straight into, and 'stream'
+                returns the unread requests.Response, which the caller
+                must close.
+        
+        Returns:
+            dict or str: The decoded JSON response or, if not JSON, the
+            response text.  For raw, bytes, memoryview or requests.Response.
+        
+        Raises:
+            ValueError: If raw is not a known mode.
+            Any requests errors if the response code is not ok.
+        """
+        raw = kwargs.pop('raw', False)
+        if raw not in self.raw_modes:
+            raise ValueError(f'raw must be one of {self.raw_modes}')
+        
+        # Share concurrent identical reads of shareable results
+        if (self.__coalesce is not None and method.lower() in ('get', 'head')
+                and raw in (False, True, 'bytes') and set(kwargs) <= {'params', 'headers'}):
+            key = (scope(self.host, self.auth), method.lower(), rest_url,
+                   freeze(kwargs.get('params')), freeze(kwargs.get('headers')), raw)
+            return self.__coalesce.do(
+                key, lambda: self.__restrequest(method, rest_url, raw, **kwargs))
+        
+        return self.__restrequest(method, rest_url, raw, **kwargs)
+    
+    def __restrequest(self, method, rest_url, raw, **kwargs):
+        """restrequest() after the raw mode is checked."""
+        if raw == 'stream':
+            return self.restresponse(method, rest_url, stream=True, **kwargs)
+        
+        if raw == 'memoryview':
+            response = self.restresponse(method, rest_url, stream=True, **kwargs)
+            with response:
+                return self.__readinto(response)
+        
+        response = self.restresponse(method, rest_url, **kwargs)
+        if raw:
+            return response.content
+        return self.decode_body(response.content,
+                                response.headers.get('Content-Type'),
+                                rest_url, method)
+    
+    @staticmethod
+    def __readinto(response, chunk_size=2**20):
+        """
+        Reads a streamed response body into one preallocated buffer,
+        avoiding the chunk list and join of Response.content.
+        """
+        length = response.headers.get('Content-Length')
+        if length is None or response.headers.get('Content-Encoding') not in (None, 'identity'):
+            return memoryview(response.content)
+        
+        buffer = bytearray(int(length))
+        view = memoryview(buffer)
+        pos = 0
+        while pos < len(buffer):
+            n = response.raw.readinto(view[pos:pos + chunk_size])
+            if not n:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f'Response ended after {pos} of {len(buffer)} bytes')
+            pos += n
+        return view
     
     def resthead(self, rest_url, **kwargs):
         """
@@ -0,0 +1,123 @@
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+class RetryPolicy():
+    """
+    Settings deciding which failed calls are retried and how long to wait
+    between attempts.  Waits grow exponentially with random jitter, and a
+    Retry-After header sent by the server is honored.
+    """
+    def __init__(self, total=3, backoff_factor=0.5, backoff_max=30.0,
+                 jitter=True, status_forcelist=(429, 502, 503, 504),
+                 allowed_methods=('HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS'),
+                 respect_retry_after=True, retry_after_max=300.0):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        total : int, optional
+            The maximum number of retries of one call. Default value is 3.
+        backoff_factor : float, optional
+            The wait before retry n is backoff_factor * 2**n seconds.
+            Default value is 0.5.
+        backoff_max : float, optional
+            The maximum exponential wait in seconds. Default value is 30.
+        jitter : bool, optional
+            If True (default), each wait is drawn uniformly between 0 and
+            the exponential wait so that clients do not retry in lockstep.
+        status_forcelist : tuple of int, optional
+            Response codes that are retried.  Default value is
+            (429, 502, 503, 504).
+        allowed_methods : tuple of str, optional
+            Methods that are idempotent and therefore retried.  Calls with
+            other methods are only retried if marked idempotent.  Default
+            value is ('HEAD', 'GET', 'PUT', 'DELETE', 'OPTIONS').
+        respect_retry_after : bool, optional
+            If True (default), a Retry-After header replaces the
+            exponential wait.
+        retry_after_max : float, optional
+            The maximum Retry-After wait honored in seconds. Default value
+            is 300.
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.status_forcelist = frozenset(status_forcelist)
+        self.allowed_methods = frozenset(m.upper() for m in allowed_methods)
+        self.respect_retry_after = respect_retry_after
+        self.retry_after_max = retry_after_max
+    
+    def is_idempotent(self, method, idempotent=None):
+        """
+        Checks if a call can safely be sent again.
+        
+        Parameters
+        ----------
+        method : str
+            The HTTP method.
+        idempotent : bool, optional
+            Overrides the decision based on allowed_methods, e.g. for a
+            create with a client-supplied handle.
+        
+        Returns
+        -------
+        bool
+        """
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in self.allowed_methods
+    
+    def retry_after(self, response):
+        """
+        Reads the wait requested by a response's Retry-After header.
+        
+        Parameters
+        ----------
+        response : requests.Response
+            The response.
+        
+        Returns
+        -------
+        float or None
+            The wait in seconds, or None if not given or not valid.
+        """
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            wait = float(value)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(wait, 0.0), self.retry_after_max)
+    
+    def backoff(self, attempt, response=None):
+        """
+        Computes the wait before a retry.
+        
+        Parameters
+        ----------
+        attempt : int
+            The number of retries already made for the call.
+        response : requests.Response, optional
+            The failed response, if any, checked for Retry-After.
+        
+        Returns
+        -------
+        float
+            The wait in seconds.
+        """
+        if self.respect_retry_after and response is not None:
+            wait = self.retry_after(response)
+            if wait is not None:
+                return wait
+        
+        wait = min(self.backoff_max, self.backoff_factor * 2 ** attempt)
+        if self.jitter:
+            wait = random.uniform(0, wait)
+        return wait
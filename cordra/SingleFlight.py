@@ -0,0 +1,147 @@
+from concurrent.futures import Future
+import threading
+
+def freeze(params):
+    """
+    Converts request params or headers into a hashable key.
+
+    Parameters
+    ----------
+    params : dict, list of tuples, str or None
+        The params.
+
+    Returns
+    -------
+    tuple, str or None
+    """
+    if params is None or isinstance(params, (str, bytes)):
+        return params
+    if isinstance(params, dict):
+        return tuple(sorted((str(k), str(v)) for k, v in params.items()))
+    return tuple((str(k), str(v)) for k, v in params)
+
+def scope(host, auth):
+    """
+    Identifies the server and credentials a call is made with, so that
+    identical calls of clients sharing a SingleFlight are only shared when
+    they would get the same response.
+
+    Parameters
+    ----------
+    host : str
+        The URL of the server.
+    auth : any
+        The auth the call is sent with.  Unhashable auth objects are
+        identified by identity.
+
+    Returns
+    -------
+    tuple
+    """
+    try:
+        hash(auth)
+    except TypeError:
+        auth = id(auth)
+    return (host, auth)
+
+class SingleFlight():
+    """
+    Deduplicates concurrent identical calls: while a call for a key is in
+    flight, other callers with the same key wait for it and receive its
+    result, or its exception, instead of making their own call.  Results
+    are shared between callers, so they should be treated as read-only.
+    Works for threads with do() and for asyncio tasks with do_async().
+    """
+    def __init__(self):
+        """Class initialization"""
+        self.__lock = threading.Lock()
+        self.__calls = {}
+        self.__tasks = {}
+        self.__leaders = 0
+        self.__shared = 0
+
+    @property
+    def stats(self):
+        """dict: The numbers of calls made and of calls that shared one."""
+        with self.__lock:
+            return {'calls': self.__leaders, 'shared': self.__shared}
+
+    def do(self, key, func):
+        """
+        Calls func, unless a call for key is already in flight, in which
+        case waits for that call instead.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies identical calls.
+        func : callable
+            Makes the call, taking no arguments.
+
+        Returns
+        -------
+        any
+            The result of func, or of the call in flight.
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls[key] = Future()
+                self.__leaders += 1
+            else:
+                self.__shared += 1
+
+        if leader:
+            try:
+                result = func()
+            except BaseException as e:
+                with self.__lock:
+                    del self.__calls[key]
+                call.set_exception(e)
+                raise
+            with self.__lock:
+                del self.__calls[key]
+            call.set_result(result)
+            return result
+
+        return call.result()
+
+    async def do_async(self, key, func):
+        """
+        Awaits func(), unless a call for key is already in flight in the
+        same event loop, in which case awaits that call instead.  The call
+        runs as its own task, so cancelling one waiting caller does not
+        cancel it for the others.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies identical calls.
+        func : callable
+            Returns the coroutine making the call, taking no arguments.
+
+        Returns
+        -------
+        any
+            The result of the call.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        with self.__lock:
+            task = self.__tasks.get(key)
+            if task is None:
+                task = self.__tasks[key] = loop.create_task(func())
+                self.__leaders += 1
+
+                def done(task):
+                    with self.__lock:
+                        if self.__tasks.get(key) is task:
+                            del self.__tasks[key]
+                task.add_done_callback(done)
+            else:
+                self.__shared += 1
+
+        return await asyncio.shield(task)
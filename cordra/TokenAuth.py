@@ -0,0 +1,159 @@
+import threading
+import time
+
+import requests
+
+class TokenAuth(requests.auth.AuthBase):
+    """
+    Bearer token authentication for a Cordra server.  A token is obtained
+    from auth/token once and attached to every call, so the server does
+    not have to verify the password each time.  The token is checked with
+    auth/introspect before it is expected to expire and replaced if it is
+    no longer active.  One instance can be shared by any number of threads.
+    Token calls are made from within other calls, so they are sent outside
+    the client's rate and concurrency limits.
+    """
+    def __init__(self, client, username, password, lifetime=1800, margin=60):
+        """
+        Class initialization
+        
+        Parameters
+        ----------
+        client : RestClient
+            The client used to send the token calls.
+        username : str
+            The username to obtain tokens for.
+        password : str
+            The password of the user.
+        lifetime : float, optional
+            Seconds a token stays valid after its last use, matching the
+            server's session timeout. Default value is 1800.
+        margin : float, optional
+            Seconds before the expected expiry at which the token is
+            checked, at most half the lifetime. Default value is 60.
+        """
+        self.__client = client
+        self.__username = username
+        self.__password = password
+        self.__lifetime = lifetime
+        self.__margin = margin
+        
+        self.__lock = threading.Lock()
+        self.__token = None
+        self.__exp = None
+        self.__check_at = 0.0
+    
+    @property
+    def username(self):
+        """str: The username the tokens are obtained for."""
+        return self.__username
+    
+    @property
+    def token(self):
+        """str or None: The current access token."""
+        return self.__token
+    
+    def __schedule(self, exp=None):
+        """
+        Sets when the token next needs checking: before the idle timeout,
+        and before the last expiry time the server gave, if any.
+        """
+        if exp is not None:
+            self.__exp = exp
+        margin = min(self.__margin, self.__lifetime / 2)
+        check_at = time.time() + self.__lifetime - margin
+        if self.__exp is not None:
+            check_at = min(check_at, self.__exp - margin)
+        self.__check_at = check_at
+    
+    def __acquire(self):
+        auth_json = dict()
+        auth_json['grant_type'] = 'password'
+        auth_json['username'] = self.__username
+        auth_json['password'] = self.__password
+        
+        r = self.__client.restpost('auth/token', data=auth_json, auth=None,
+                                   limit=False)
+        self.__token = r['access_token']
+        self.__exp = None
+        self.__schedule(r.get('exp'))
+    
+    def __check(self):
+        r = self.__client.restpost('auth/introspect', data={'token': self.__token},
+                                   auth=None, limit=False)
+        exp = r.get('exp')
+        if not r.get('active', False) or (exp is not None and exp - self.__margin <= time.time()):
+            self.__acquire()
+        else:
+            self.__schedule(exp)
+    
+    def acquire(self):
+        """
+        Obtains a new token, replacing any current one.
+        """
+        with self.__lock:
+            self.__acquire()
+    
+    def valid_token(self):
+        """
+        Returns a token that is expected to be valid, obtaining or checking
+        it first if needed.
+        
+        Returns
+        -------
+        str
+            The access token.
+        """
+        with self.__lock:
+            if self.__token is None:
+                self.__acquire()
+            elif time.time() >= self.__check_at:
+                self.__check()
+            else:
+                # Every use restarts the server's idle timeout, but not
+                # past the token's expiry
+                self.__schedule(self.__exp)
+            return self.__token
+    
+    def revoke(self):
+        """
+        Revokes the current token, if any, on the server.
+        """
+        with self.__lock:
+            if self.__token is None:
+                return
+            token, self.__token = self.__token, None
+            self.__client.restpost('auth/revoke', data={'token': token}, auth=None,
+                                   limit=False)
+    
+    def __call__(self, r):
+        token = self.valid_token()
+        r.headers['Authorization'] = f'Bearer {token}'
+        r.register_hook('response', self.__handle_401)
+        return r
+    
+    def __handle_401(self, r, **kwargs):
+        """Replaces a token rejected by the server and resends the call once."""
+        if r.status_code != 401 or getattr(r.request, 'token_retried', False):
+            return r
+        
+        # A streamed body cannot be sent again
+        if r.request.body is not None and not isinstance(r.request.body, (bytes, str)):
+            return r
+        
+        used = r.request.headers.get('Authorization', '')
+        with self.__lock:
+            if self.__token is None or used == f'Bearer {self.__token}':
+                self.__acquire()
+            token = self.__token
+        
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep.headers['Authorization'] = f'Bearer {token}'
+        prep.token_retried = True
+        
+        _r = r.connection.send(prep, **kwargs)
+        _r.history.append(r)
+        _r.request = prep
+        return _r
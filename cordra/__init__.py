@@ -1,30 +1,82 @@
 """ This is a simple Python library for interacting with the REST interface of an instance of Cordra.
+
+Names are imported from their submodules on first access (PEP 562), so
+importing the package is fast and requests is only loaded when a client
+is used.
 """
-from .aslist import aslist, iaslist
-from .Payloads import Payloads
-#from .cordra import CordraObject, Token
-from .CordraClient import CordraClient
+import importlib
+import sys
+from types import ModuleType
+
+# Public names and the submodules that define them
+_lazy = {
+    'aslist': 'aslist',
+    'iaslist': 'aslist',
+    'MultipartEncoder': 'MultipartEncoder',
+    'Payloads': 'Payloads',
+    'BulkResult': 'bulk',
+    'bulk_map': 'bulk',
+    'ConcurrencyLimiter': 'ConcurrencyLimiter',
+    'JSONCodec': 'JSONCodec',
+    'MetricsCollector': 'MetricsCollector',
+    'RateLimiter': 'RateLimiter',
+    'FindIterator': 'FindIterator',
+    'LazyObject': 'LazyObject',
+    'ObjectCache': 'ObjectCache',
+    'RetryPolicy': 'RetryPolicy',
+    'SingleFlight': 'SingleFlight',
+    'TokenAuth': 'TokenAuth',
+    #'CordraObject': 'cordra',
+    #'Token': 'cordra',
+    'CordraClient': 'CordraClient',
+    'AsyncCordraClient': 'AsyncCordraClient',
+    'CordraMirror': 'CordraMirror',
+}
 
 
 def get_version():
-    """Get the version of the code from egg_info.
+    """Get the version of the installed distribution.
     Returns:
       the package version number
     """
-    from pkg_resources import get_distribution, DistributionNotFound
+    from importlib.metadata import version, PackageNotFoundError
 
     try:
-        version = get_distribution(__name__.split('.')[0]).version # pylint: disable=no-member
-    except DistributionNotFound: # pragma: no cover
-        version = "unknown, try running `python setup.py egg_info`"
+        return version('CordraPy')
+    except PackageNotFoundError: # pragma: no cover
+        return "unknown, try running `pip install -e .`"
+
+
+def __getattr__(name):
+    if name == '__version__':
+        value = globals()['__version__'] = get_version()
+        return value
+
+    if name not in _lazy:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = importlib.import_module(f'.{_lazy[name]}', __name__)
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+class _Package(ModuleType):
+    """
+    The package module.  Importing a submodule binds it on the package
+    under its own name, which would hide the class or function of the same
+    name, so those are bound instead.
+    """
+    def __setattr__(self, name, value):
+        if (isinstance(value, ModuleType) and _lazy.get(name) == name
+                and value.__name__ == f'{__name__}.{name}'):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
 
-    return version
 
+def __dir__():
+    return sorted(set(globals()) | set(_lazy) | {'__version__'})
 
-__version__ = get_version()
 
-#__all__ = [
-#    "__version__",
-#    "CordraObject",
-#    "Token"
-#]
\ No newline at end of file
+__all__ = ['__version__'] + list(_lazy)
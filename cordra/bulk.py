@@ -0,0 +1,78 @@
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+BulkResult = namedtuple('BulkResult', ['index', 'item', 'result', 'error'])
+BulkResult.__doc__ = """
+The outcome of one item of a bulk operation.
+
+Fields
+------
+index : int
+    The position of the item in the input.
+item : any
+    The input item.
+result : any
+    The value returned for the item, or None if it failed.
+error : Exception or None
+    The exception raised for the item, or None if it succeeded.
+"""
+
+def bulk_map(func, items, max_workers=10, ordered=True):
+    """
+    Calls func on every item using a pool of worker threads.  items is
+    consumed lazily and at most 2 * max_workers calls are pending at once,
+    so arbitrarily long inputs can be streamed through.
+    
+    Parameters
+    ----------
+    func : callable
+        Function taking a single item.
+    items : iterable
+        The items to process.
+    max_workers : int, optional
+        The number of worker threads. Default value is 10.
+    ordered : bool, optional
+        If True (default), results are yielded in submission order.  If
+        False, results are yielded as soon as they complete.
+    
+    Yields
+    ------
+    BulkResult
+        One per item.  Exceptions raised by func are collected in the
+        error field rather than stopping the remaining items.
+    """
+    def run(index, item):
+        try:
+            return BulkResult(index, item, func(item), None)
+        except Exception as e:
+            return BulkResult(index, item, None, e)
+
+    max_pending = 2 * max_workers
+    executor = ThreadPoolExecutor(max_workers)
+    pending = deque() if ordered else set()
+    
+    def drain(count):
+        """Yields results until at most count calls are pending."""
+        while len(pending) > count:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+
+    try:
+        for index, item in enumerate(items):
+            future = executor.submit(run, index, item)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+            yield from drain(max_pending - 1)
+        yield from drain(0)
+    finally:
+        # Drop calls not yet started if the caller stops early
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
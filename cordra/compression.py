@@ -0,0 +1,78 @@
+"""
+Compression of request bodies, and the Accept-Encoding header advertising
+the response encodings that can be decoded.  zstd needs Python 3.14 or the
+zstandard package.
+"""
+import zlib
+
+encodings = ('gzip', 'deflate', 'zstd')
+
+def zstd_module():
+    """Returns the available zstd implementation, or None."""
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def check_encoding(encoding):
+    """
+    Raises an error if request bodies cannot be compressed with encoding.
+
+    Parameters
+    ----------
+    encoding : str
+        'gzip', 'deflate' or 'zstd'.
+    """
+    if encoding not in encodings:
+        raise ValueError(f'encoding must be one of {encodings}')
+    if encoding == 'zstd' and zstd_module() is None:
+        raise ImportError('zstd compression requires zstandard: pip install zstandard')
+
+def compress(data, encoding, level=None):
+    """
+    Compresses a request body.
+
+    Parameters
+    ----------
+    data : bytes-like
+        The body.
+    encoding : str
+        'gzip', 'deflate' or 'zstd'.
+    level : int, optional
+        The compression level.  By default a fast level is used, as bodies
+        are compressed on every call.
+
+    Returns
+    -------
+    bytes
+    """
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == 'deflate':
+        return zlib.compress(data, 6 if level is None else level)
+    if encoding == 'zstd':
+        zstd = zstd_module()
+        level = 3 if level is None else level
+        if zstd.__name__ == 'zstandard':
+            return zstd.ZstdCompressor(level=level).compress(data)
+        return zstd.compress(data, level=level)
+    raise ValueError(f'encoding must be one of {encodings}')
+
+def accept_encoding():
+    """
+    The Accept-Encoding header listing every response encoding that the
+    installed urllib3 decodes, including br and zstd when their packages
+    are installed.
+    """
+    try:
+        from requests.packages.urllib3.util.request import ACCEPT_ENCODING # pylint: disable=import-error
+    except ImportError:
+        return 'gzip, deflate'
+    return ', '.join(e.strip() for e in ACCEPT_ENCODING.split(','))
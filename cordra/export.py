@@ -0,0 +1,416 @@
+"""
+Streams every result of a CordraClient.find() query to JSON Lines, CSV or
+Parquet files, fetching pages concurrently and checkpointing so that an
+interrupted export can be resumed.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+from pathlib import Path
+import sys
+import time
+from urllib.parse import quote
+
+from .bulk import bulk_map
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+formats = ('jsonl', 'csv', 'parquet')
+
+def flatten(obj, prefix=''):
+    """
+    Flattens nested dicts into one dict with dotted keys.  Lists are
+    encoded as JSON strings.
+
+    Parameters
+    ----------
+    obj : dict
+        The object to flatten.
+    prefix : str, optional
+        Prefix for all keys.
+
+    Returns
+    -------
+    dict
+    """
+    out = {}
+    for key, value in obj.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict) and value:
+            out.update(flatten(value, name + '.'))
+        elif isinstance(value, (dict, list)):
+            out[name] = json.dumps(value)
+        else:
+            out[name] = value
+    return out
+
+def rows(objs, full):
+    """Flattens objects into rows with id and type columns if full."""
+    for obj in objs:
+        if full:
+            row = {'id': obj.get('id'), 'type': obj.get('type')}
+            row.update(flatten(obj.get('content') or {}, 'content.'))
+        else:
+            row = flatten(obj)
+        yield row
+
+class JSONLWriter():
+    """Appends objects to a JSON Lines file."""
+    def __init__(self, dest, codec, state):
+        self.path = Path(dest)
+        self.codec = codec
+        offset = state.get('offset', 0)
+        if self.path.exists() and offset:
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        self.file = open(self.path, 'ab' if offset else 'wb')
+
+    def write(self, objs, full):
+        self.file.write(b''.join(self.codec.dumps(obj) + b'\n' for obj in objs))
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'offset': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+class CSVWriter():
+    """
+    Appends flattened objects to a CSV file.  The columns are those of the
+    first page unless given; fields outside them are kept as JSON in an
+    _extra column.
+    """
+    def __init__(self, dest, codec, state, columns=None):
+        self.path = Path(dest)
+        self.columns = state.get('columns', columns)
+        offset = state.get('offset', 0)
+        if self.path.exists() and offset:
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        self.file = open(self.path, 'a' if offset else 'w', newline='', encoding='utf-8')
+        self.writer = None
+        if self.columns is not None and offset:
+            self.writer = csv.DictWriter(self.file, self.columns + ['_extra'])
+
+    def write(self, objs, full):
+        page = list(rows(objs, full))
+        if self.writer is None:
+            if self.columns is None:
+                self.columns = list(dict.fromkeys(k for row in page for k in row))
+            self.writer = csv.DictWriter(self.file, self.columns + ['_extra'])
+            self.writer.writeheader()
+        known = set(self.columns)
+        for row in page:
+            extra = {k: row.pop(k) for k in list(row) if k not in known}
+            if extra:
+                row['_extra'] = json.dumps(extra)
+            self.writer.writerow(row)
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'offset': self.file.tell(), 'columns': self.columns}
+
+    def close(self):
+        self.file.close()
+
+def column_kind(values):
+    """
+    The Parquet type of a column of values: 'bool', 'int64', 'float64',
+    or 'string' for strings, mixed types and empty columns.
+    """
+    types = {type(v) for v in values if v is not None}
+    if types == {bool}:
+        return 'bool'
+    if types == {int} and all(-2**63 <= v < 2**63 for v in values if v is not None):
+        return 'int64'
+    if types and types <= {int, float}:
+        return 'float64'
+    return 'string'
+
+def fits(value, kind):
+    """Whether a value can be stored in a column of the Parquet type."""
+    if kind == 'bool':
+        return isinstance(value, bool)
+    if kind == 'int64':
+        return type(value) is int and -2**63 <= value < 2**63
+    if kind == 'float64':
+        return type(value) in (int, float)
+    return True
+
+class ParquetWriter():
+    """
+    Writes flattened objects to a directory of Parquet part files, each
+    holding up to rows_per_file rows.  Only the current part is held in
+    memory.  All parts share the schema inferred from the first part:
+    columns of mixed types are strings, with other values JSON-encoded,
+    and fields outside the schema, or not fitting their column's type,
+    are kept as JSON in an _extra column.
+    """
+    def __init__(self, dest, codec, state, rows_per_file=100000):
+        if pyarrow is None:
+            raise ImportError('Parquet export requires pyarrow: pip install pyarrow')
+        self.path = Path(dest)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.rows_per_file = rows_per_file
+        self.part = state.get('part', 0)
+        self.columns = state.get('columns')
+        self.buffer = []
+
+        # Drop parts written after the checkpoint
+        for stale in self.path.glob('part-*.parquet'):
+            if int(stale.stem.split('-')[1]) >= self.part:
+                stale.unlink()
+
+    def write(self, objs, full):
+        self.buffer.extend(rows(objs, full))
+
+    def ready(self):
+        return len(self.buffer) >= self.rows_per_file
+
+    def schema(self):
+        fields = [(name, getattr(pyarrow, kind)()) for name, kind in self.columns]
+        return pyarrow.schema(fields + [('_extra', pyarrow.string())])
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.columns is None:
+            names = list(dict.fromkeys(k for row in self.buffer for k in row if k != '_extra'))
+            self.columns = [[name, column_kind([row.get(name) for row in self.buffer])]
+                            for name in names]
+
+        data = {name: [] for name, _ in self.columns}
+        data['_extra'] = []
+        for row in self.buffer:
+            row = dict(row)
+            for name, kind in self.columns:
+                value = row.pop(name, None)
+                if value is None or fits(value, kind):
+                    if kind == 'string' and value is not None and not isinstance(value, str):
+                        value = json.dumps(value)
+                    data[name].append(value)
+                else:
+                    data[name].append(None)
+                    row[name] = value
+            data['_extra'].append(json.dumps(row) if row else None)
+
+        schema = self.schema()
+        table = pyarrow.table(data, schema=schema)
+        with pyarrow.parquet.ParquetWriter(self.path / f'part-{self.part:05d}.parquet',
+                                           schema) as writer:
+            writer.write_table(table)
+        self.part += 1
+        self.buffer = []
+
+    def checkpoint(self):
+        self.flush()
+        return {'part': self.part, 'columns': self.columns}
+
+    def close(self):
+        self.flush()
+
+def payload_path(payloads_dir, id, name):
+    """The local path of a downloaded payload."""
+    return Path(payloads_dir, quote(id, safe=''), quote(name, safe=''))
+
+def download_payloads(client, obj, payloads_dir):
+    """Downloads an object's payloads, skipping complete earlier downloads."""
+    count = 0
+    for payload in obj.get('payloads', []):
+        path = payload_path(payloads_dir, obj['id'], payload['name'])
+        if path.exists() and path.stat().st_size == payload.get('size'):
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        client.download_payload(obj['id'], payload['name'], path, resume=True)
+        count += 1
+    return count
+
+def export(client, query, dest, format='jsonl', full=True, pageSize=1000,
+           max_workers=4, checkpoint=None, payloads_dir=None, jsonFilter=None,
+           sortFields='id', columns=None, rows_per_file=100000, progress=None):
+    """
+    Exports all results of a query.  Pages are fetched by a pool of
+    threads and written in order, with at most 2 * max_workers pages in
+    memory at once.
+
+    Parameters
+    ----------
+    client : CordraClient
+        The client to query through.
+    query : str
+        The query.
+    dest : str or path-like
+        The output file, or directory for parquet.
+    format : str, optional
+        'jsonl' (default), 'csv' or 'parquet'.  csv and parquet flatten
+        content fields into dotted columns and encode lists as JSON.
+        parquet requires pyarrow.
+    full : bool, optional
+        If True (default), full Cordra objects are exported, else only
+        their content.
+    pageSize : int, optional
+        The number of results per request. Default value is 1000.
+    max_workers : int, optional
+        The number of pages fetched at once. Default value is 4.
+    checkpoint : str or path-like, optional
+        A JSON file recording progress after every page (every part for
+        parquet).  If it exists and matches the export, the export
+        resumes from it and the output is truncated to the checkpointed
+        position.  It is removed when the export completes.
+    payloads_dir : str or path-like, optional
+        If given, the payloads of each object are downloaded into
+        payloads_dir/<quoted id>/<quoted name>.  Requires full.
+    jsonFilter : list, optional
+        jsonPointers restricting the exported objects.
+    sortFields : str, optional
+        The sort order.  Paging by page number needs a stable order, so
+        the default is 'id'.
+    columns : list of str, optional
+        The csv columns.  By default those of the first page.
+    rows_per_file : int, optional
+        The rows per parquet part file. Default value is 100000.
+    progress : callable, optional
+        Called as progress(exported, total) after every page.
+
+    Returns
+    -------
+    dict
+        The numbers of objects exported and payloads downloaded, and the
+        seconds taken.
+    """
+    if format not in formats:
+        raise ValueError(f'format must be one of {formats}')
+    if payloads_dir is not None and not full:
+        raise ValueError('payloads_dir requires full')
+
+    settings = {'query': query, 'format': format, 'full': full, 'pageSize': pageSize,
+                'jsonFilter': jsonFilter, 'sortFields': sortFields}
+    state = {'page': 0, 'exported': 0, 'payloads': 0, 'writer': {}}
+    if checkpoint is not None and Path(checkpoint).exists():
+        saved = json.loads(Path(checkpoint).read_text())
+        if saved['settings'] != settings:
+            raise ValueError(f'checkpoint {checkpoint} is for a different export')
+        state = saved['state']
+
+    def fetch(pageNum):
+        r = client.find(query, full=full, pageNum=pageNum, pageSize=pageSize,
+                        jsonFilter=jsonFilter, sortFields=sortFields)
+        downloaded = 0
+        if payloads_dir is not None:
+            for obj in r['results']:
+                downloaded += download_payloads(client, obj, payloads_dir)
+        return r, downloaded
+
+    def save():
+        if checkpoint is None:
+            return
+        tmp = Path(str(checkpoint) + '.tmp')
+        tmp.write_text(json.dumps({'settings': settings, 'state': state}))
+        os.replace(tmp, checkpoint)
+
+    codec = client.json_codec
+    if format == 'jsonl':
+        writer = JSONLWriter(dest, codec, state['writer'])
+    elif format == 'csv':
+        writer = CSVWriter(dest, codec, state['writer'], columns=columns)
+    else:
+        writer = ParquetWriter(dest, codec, state['writer'], rows_per_file=rows_per_file)
+
+    start = time.perf_counter()
+    try:
+        start_page = state['page']
+        first, downloaded = fetch(start_page)
+        total = first.get('size', -1)
+        npages = math.ceil(total / pageSize) if total >= 0 else start_page + 1
+
+        def pages():
+            yield start_page, (first, downloaded)
+            for result in bulk_map(fetch, range(start_page + 1, npages), max_workers):
+                if result.error is not None:
+                    raise result.error
+                yield result.item, result.result
+            # Objects added during the export extend the last page
+            pageNum = max(npages, start_page + 1)
+            while True:
+                r, n = fetch(pageNum)
+                if not r['results']:
+                    break
+                yield pageNum, (r, n)
+                if len(r['results']) < pageSize:
+                    break
+                pageNum += 1
+
+        for pageNum, (r, n) in pages():
+            writer.write(r['results'], full)
+            state['exported'] += len(r['results'])
+            state['payloads'] += n
+            if not isinstance(writer, ParquetWriter) or writer.ready():
+                state['writer'] = writer.checkpoint()
+                state['page'] = pageNum + 1
+                save()
+            if progress is not None:
+                progress(state['exported'], total)
+            if len(r['results']) < pageSize:
+                break
+    finally:
+        writer.close()
+
+    if checkpoint is not None and Path(checkpoint).exists():
+        Path(checkpoint).unlink()
+
+    return {
+        'exported': state['exported'],
+        'payloads': state['payloads'],
+        'seconds': time.perf_counter() - start,
+    }
+
+def main(args=None):
+    """The cordra-export console command."""
+    from .CordraClient import CordraClient
+
+    parser = argparse.ArgumentParser(
+        prog='cordra-export',
+        description='Export the results of a Cordra query to JSON Lines, CSV or Parquet.')
+    parser.add_argument('host', help='URL of the Cordra server')
+    parser.add_argument('query', help='the query, e.g. type:Document')
+    parser.add_argument('dest', help='output file, or directory for parquet')
+    parser.add_argument('--format', choices=formats, default='jsonl')
+    parser.add_argument('--username', default=os.environ.get('CORDRA_USERNAME'),
+                        help='defaults to $CORDRA_USERNAME, else prompted')
+    parser.add_argument('--password', default=os.environ.get('CORDRA_PASSWORD'),
+                        help='defaults to $CORDRA_PASSWORD, else prompted')
+    parser.add_argument('--content-only', action='store_true',
+                        help='export only object content')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--checkpoint', help='checkpoint file for resuming')
+    parser.add_argument('--payloads', help='directory to download payloads into')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='do not verify the server TLS certificate')
+    args = parser.parse_args(args)
+
+    start = time.perf_counter()
+    def progress(exported, total):
+        rate = exported / (time.perf_counter() - start)
+        print(f'\r{exported}/{total} objects ({rate:.0f}/s)', end='', file=sys.stderr, flush=True)
+
+    with CordraClient(args.host, username=args.username, password=args.password,
+                      verify=not args.no_verify, pool_maxsize=args.workers) as client:
+        result = export(client, args.query, args.dest, format=args.format,
+                        full=not args.content_only, pageSize=args.page_size,
+                        max_workers=args.workers, checkpoint=args.checkpoint,
+                        payloads_dir=args.payloads, progress=progress)
+    print(f'\nExported {result["exported"]} objects and {result["payloads"]} payloads '
+          f'in {result["seconds"]:.1f} s', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Streams rows from CSV or JSON Lines files into Cordra objects: rows are
+read lazily, mapped to object content, optionally validated against a
+JSON schema, and written in parallel batches with checkpoints so that an
+interrupted import resumes where it stopped.
+"""
+import argparse
+import codecs
+import csv
+import hashlib
+import importlib
+import json
+import os
+from pathlib import Path
+import sys
+import time
+
+from .bulk import bulk_map
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+def read_rows(path, format=None, offset=None, row=0):
+    """
+    Lazily reads rows from a CSV or JSON Lines file.
+
+    Parameters
+    ----------
+    path : str or path-like
+        The file.
+    format : str, optional
+        'csv' or 'jsonl'.  By default taken from the file extension.
+    offset : int, optional
+        A position returned with an earlier row to continue reading from.
+    row : int, optional
+        The number of the row at offset. Default value is 0.
+
+    Yields
+    ------
+    row : int
+        The row number, counting from 0 after any CSV header.
+    data : dict
+        The row.
+    offset : int
+        The position after the row, for resuming.
+    nbytes : int
+        The approximate number of bytes read for the row.
+    """
+    path = Path(path)
+    if format is None:
+        format = 'jsonl' if path.suffix.lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+    if format not in ('csv', 'jsonl'):
+        raise ValueError("format must be 'csv' or 'jsonl'")
+
+    # Read bytes and count them, as text-mode tell() is slow
+    with open(path, 'rb') as f:
+        first = f.readline()
+        start = 3 if first.startswith(codecs.BOM_UTF8) else 0
+        if format == 'csv':
+            fieldnames = next(csv.reader([first[start:].decode('utf-8')]))
+            start = len(first)
+        position = start if offset is None else offset
+        f.seek(position)
+
+        end = position
+        def lines():
+            nonlocal end
+            for line in f:
+                end += len(line)
+                yield line.decode('utf-8')
+
+        if format == 'csv':
+            for values in csv.reader(lines()):
+                if values:
+                    yield row, dict(zip(fieldnames, values)), end, end - position
+                    row += 1
+                position = end
+        else:
+            for line in lines():
+                if line.strip():
+                    yield row, json.loads(line), end, end - position
+                    row += 1
+                position = end
+
+def infer_types(data):
+    """Converts str values that look like ints or floats to numbers."""
+    out = {}
+    for key, value in data.items():
+        if isinstance(value, str):
+            try:
+                value = int(value)
+            except ValueError:
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+        out[key] = value
+    return out
+
+def content_suffix(content):
+    """A suffix derived from a hash of the content."""
+    canonical = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:20]
+
+def import_rows(client, path, obj_type, format=None, mapping=None, suffix=None,
+                prefix=None, schema=None, chunk_size=1000, max_workers=4,
+                checkpoint=None, errors=None, progress=None):
+    """
+    Imports every row of a CSV or JSON Lines file as a Cordra object.
+    Chunks of rows are written in parallel; a checkpoint is saved as each
+    chunk completes, in input order.  Objects get deterministic ids, so
+    rows written after the last checkpoint are simply written again when
+    resuming.
+
+    Parameters
+    ----------
+    client : CordraClient
+        The client to write through.
+    path : str or path-like
+        The input file.
+    obj_type : str
+        The type of the objects.
+    format : str, optional
+        'csv' or 'jsonl'.  By default taken from the file extension.
+    mapping : callable, optional
+        Converts a row dict to object content.  Default uses the row as
+        it is.
+    suffix : str or callable, optional
+        Derives each object's handle suffix: a column name, a format
+        string of columns like 'sample-{SAM0}', or a callable taking the
+        row and content.  By default a hash of the content is used.
+    prefix : str, optional
+        The handle prefix.  If given, chunks are sent with batchUpload,
+        which creates or updates each object.  If not, objects are created
+        one at a time with the suffix, and objects that already exist are
+        counted as skipped.
+    schema : dict or str or path-like, optional
+        A JSON schema, or file of one, that content is checked against
+        before sending.  Requires jsonschema.
+    chunk_size : int, optional
+        The rows per chunk. Default value is 1000.
+    max_workers : int, optional
+        The chunks written at once. Default value is 4.
+    checkpoint : str or path-like, optional
+        A JSON file recording the rows done.  If it exists, the import
+        resumes from it.  It is removed when the import completes.
+    errors : str or path-like, optional
+        A JSON Lines file that rows failing mapping, validation or writing
+        are appended to, with the error.
+    progress : callable, optional
+        Called with the stats dict after every chunk.
+
+    Returns
+    -------
+    dict
+        rows, written, skipped, failed, bytes, seconds, rows_per_sec and
+        bytes_per_sec.
+    """
+    if schema is not None:
+        if jsonschema is None:
+            raise ImportError('schema validation requires jsonschema: pip install jsonschema')
+        if not isinstance(schema, dict):
+            schema = json.loads(Path(schema).read_text())
+        validator = jsonschema.validators.validator_for(schema)(schema)
+    else:
+        validator = None
+
+    if suffix is None:
+        derive = lambda data, content: content_suffix(content)
+    elif callable(suffix):
+        derive = suffix
+    elif '{' in suffix:
+        derive = lambda data, content: suffix.format(**data)
+    else:
+        derive = lambda data, content: str(data[suffix])
+
+    stats = {'rows': 0, 'written': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+    offset, row = None, 0
+    if checkpoint is not None and Path(checkpoint).exists():
+        saved = json.loads(Path(checkpoint).read_text())
+        if saved['path'] != str(path):
+            raise ValueError(f'checkpoint {checkpoint} is for {saved["path"]}')
+        offset, row, stats = saved['offset'], saved['row'], saved['stats']
+
+    def chunks():
+        chunk, nbytes = [], 0
+        for number, data, end, n in read_rows(path, format, offset, row):
+            chunk.append((number, data))
+            nbytes += n
+            if len(chunk) >= chunk_size:
+                yield chunk, number + 1, end, nbytes
+                chunk, nbytes = [], 0
+        if chunk:
+            yield chunk, number + 1, end, nbytes
+
+    def prepare(number, data):
+        content = mapping(data) if mapping is not None else data
+        if validator is not None:
+            error = jsonschema.exceptions.best_match(validator.iter_errors(content))
+            if error is not None:
+                raise ValueError(f'invalid: {error.message}')
+        return content, derive(data, content)
+
+    def write(item):
+        chunk, _, _, _ = item
+        failures = []
+        items = []
+        for number, data in chunk:
+            try:
+                items.append((number, *prepare(number, data)))
+            except Exception as e:
+                failures.append((number, data, e))
+
+        written = skipped = 0
+        if prefix is not None:
+            objs = [(content, {'handle': f'{prefix}/{s}'}) for _, content, s in items]
+            for result in client.batch_upload(objs, obj_type=obj_type, max_count=chunk_size):
+                if result.error is None:
+                    written += 1
+                else:
+                    failures.append((items[result.index][0], result.item[0], result.error))
+        else:
+            for number, content, s in items:
+                try:
+                    if client.create(content, obj_type, suffix=s, exist_ok=True) is None:
+                        skipped += 1
+                    else:
+                        written += 1
+                except Exception as e:
+                    failures.append((number, content, e))
+        return written, skipped, failures
+
+    def save(row, offset):
+        if checkpoint is None:
+            return
+        tmp = Path(str(checkpoint) + '.tmp')
+        tmp.write_text(json.dumps({'path': str(path), 'row': row, 'offset': offset,
+                                   'stats': stats}))
+        os.replace(tmp, checkpoint)
+
+    error_file = open(errors, 'a', encoding='utf-8') if errors is not None else None
+    start = time.perf_counter()
+    seconds = stats.pop('seconds', 0.0)
+    try:
+        for result in bulk_map(write, chunks(), max_workers):
+            chunk, end_row, end_offset, nbytes = result.item
+            if result.error is not None:
+                raise result.error
+            written, skipped, failures = result.result
+            stats['rows'] += len(chunk)
+            stats['written'] += written
+            stats['skipped'] += skipped
+            stats['failed'] += len(failures)
+            stats['bytes'] += nbytes
+            if error_file is not None:
+                for number, data, error in sorted(failures, key=lambda f: f[0]):
+                    error_file.write(json.dumps({'row': number, 'data': data,
+                                                 'error': str(error)}, default=str) + '\n')
+                error_file.flush()
+            stats['seconds'] = seconds + time.perf_counter() - start
+            save(end_row, end_offset)
+            if progress is not None:
+                progress(dict(stats))
+    finally:
+        if error_file is not None:
+            error_file.close()
+
+    if checkpoint is not None and Path(checkpoint).exists():
+        Path(checkpoint).unlink()
+
+    stats['seconds'] = seconds + time.perf_counter() - start
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] else None
+    stats['bytes_per_sec'] = stats['bytes'] / stats['seconds'] if stats['seconds'] else None
+    return stats
+
+def load_callable(spec):
+    """Loads a function given as 'module:function'."""
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+def main(args=None):
+    """The cordra-import console command."""
+    from .CordraClient import CordraClient
+
+    parser = argparse.ArgumentParser(
+        prog='cordra-import',
+        description='Import the rows of a CSV or JSON Lines file as Cordra objects.')
+    parser.add_argument('host', help='URL of the Cordra server')
+    parser.add_argument('path', help='the CSV or JSON Lines file')
+    parser.add_argument('--type', required=True, help='the object type')
+    parser.add_argument('--format', choices=['csv', 'jsonl'])
+    parser.add_argument('--username', default=os.environ.get('CORDRA_USERNAME'),
+                        help='defaults to $CORDRA_USERNAME, else prompted')
+    parser.add_argument('--password', default=os.environ.get('CORDRA_PASSWORD'),
+                        help='defaults to $CORDRA_PASSWORD, else prompted')
+    parser.add_argument('--mapping', help='row mapping function as module:function')
+    parser.add_argument('--infer-types', action='store_true',
+                        help='convert numeric strings to numbers')
+    parser.add_argument('--suffix', help='column or format string for handle suffixes; '
+                        'default is a content hash')
+    parser.add_argument('--prefix', help='handle prefix; enables batchUpload')
+    parser.add_argument('--schema', help='JSON schema file to validate content against')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--checkpoint', help='checkpoint file for resuming')
+    parser.add_argument('--errors', help='JSON Lines file for failed rows')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='do not verify the server TLS certificate')
+    args = parser.parse_args(args)
+
+    mapping = load_callable(args.mapping) if args.mapping is not None else None
+    if args.infer_types:
+        mapping = (lambda data, m=mapping: infer_types(m(data) if m is not None else data))
+
+    def progress(stats):
+        print(f'\r{stats["rows"]} rows, {stats["failed"]} failed '
+              f'({stats["rows"] / stats["seconds"]:.0f} rows/s, '
+              f'{stats["bytes"] / stats["seconds"] / 2**20:.2f} MiB/s)',
+              end='', file=sys.stderr, flush=True)
+
+    with CordraClient(args.host, username=args.username, password=args.password,
+                      verify=not args.no_verify, pool_maxsize=args.workers) as client:
+        stats = import_rows(client, args.path, args.type, format=args.format,
+                            mapping=mapping, suffix=args.suffix, prefix=args.prefix,
+                            schema=args.schema, chunk_size=args.chunk_size,
+                            max_workers=args.workers, checkpoint=args.checkpoint,
+                            errors=args.errors, progress=progress)
+    print(f'\nImported {stats["written"]} of {stats["rows"]} rows '
+          f'({stats["skipped"]} existing, {stats["failed"]} failed) in {stats["seconds"]:.1f} s',
+          file=sys.stderr)
+    if stats['failed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -20,5 +20,18 @@ setup(
     author_email='zachary.trautt@nist.gov',
     include_package_data=True,
     install_requires=fetch_requirements(),
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+        'parquet': ['pyarrow'],
+        'validate': ['jsonschema'],
+        'zstd': ['zstandard'],
+    },
+    entry_points={
+        'console_scripts': [
+            'cordra-export=cordra.export:main',
+            'cordra-import=cordra.importer:main',
+        ],
+    },
     packages=find_packages()
 )